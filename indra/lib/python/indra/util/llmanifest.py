@@ -28,9 +28,9 @@ $/LicenseInfo$
 """
 
 from collections import namedtuple, defaultdict
+import concurrent.futures
 import subprocess
 import errno
-import filecmp
 import fnmatch
 import getopt
 import glob
@@ -40,10 +40,19 @@ import os
 import re
 import shlex
 import shutil
+import stat
 import subprocess
 import sys
 import tarfile
 
+# shutil's default copy buffer is 64 KiB on POSIX. When the kernel fast
+# paths (sendfile / copy_file_range / fcopyfile) don't apply -- notably
+# network mounts and cross-device copies -- the buffered fallback moves the
+# multi-MB CEF payload 64 KiB at a time; a 1 MiB buffer cuts those
+# read/write syscalls 16x for the same bytes.
+if getattr(shutil, 'COPY_BUFSIZE', 0) < 1 << 20:
+    shutil.COPY_BUFSIZE = 1 << 20
+
 class ManifestError(RuntimeError):
     """Use an exception more specific than generic Python RuntimeError"""
     def __init__(self, msg):
@@ -335,6 +344,7 @@ class LLManifest(object, metaclass=LLManifestRegistry):
         self.args = args
         self.file_list = []
         self.excludes = []
+        self._exclude_matchers = None  # compiled lazily by includes()
         self.actions = []
         self.src_prefix = [args['source']]
         self.artwork_prefix = [args['artwork']]
@@ -343,6 +353,19 @@ class LLManifest(object, metaclass=LLManifestRegistry):
         self.created_paths = []
         self.package_name = "Unknown"
         self.missing = []
+        # lazily populated by _isfile(); maps absolute path -> os.stat result
+        # (or False for paths that don't exist)
+        self._stat_cache = {}
+        # directories cmakedirs() has already ensured exist this run
+        self._ensured_dirs = set()
+        # joined prefix string per stack name, rebuilt lazily after every
+        # prefix push/pop; path() and friends otherwise re-join the same
+        # stack thousands of times per manifest
+        self._prefix_cache = {}
+        # When set (by path_patterns()), copy_action() queues (src, dst)
+        # pairs here instead of copying inline, so the batch can be
+        # drained concurrently.
+        self.deferred_copies = None
 
     def default_channel(self):
         return self.args.get('channel', None) == RELEASE_CHANNEL
@@ -356,6 +379,7 @@ class LLManifest(object, metaclass=LLManifestRegistry):
         """ Excludes all files that match the glob from being included
         in the file list by path()."""
         self.excludes.append(glob)
+        self._exclude_matchers = None
 
     def prefix(self, src='', build='', dst='', src_dst=None):
         """
@@ -402,6 +426,7 @@ class LLManifest(object, metaclass=LLManifestRegistry):
         self.artwork_prefix.append(src)
         self.build_prefix.append(build)
         self.dst_prefix.append(dst)
+        self._prefix_cache.clear()
 
 ##      self.display_stacks()
 
@@ -462,9 +487,59 @@ class LLManifest(object, metaclass=LLManifestRegistry):
                 # find the attribute in 'self.manifest' named by 'stack', and
                 # truncate that list back to 'prevlen'
                 del getattr(self.manifest, stack)[prevlen:]
+            self.manifest._prefix_cache.clear()
 
 ##          self.manifest.display_stacks()
 
+    def deferred_copy_batch(self):
+        """
+        Usage:
+
+        with self.deferred_copy_batch():
+            self.path(...)
+            ...
+
+        While the block is active, copy_action() queues its (src, dst)
+        pairs instead of copying inline; when the block exits the queued
+        data copies are drained on a thread pool. The copies are
+        independent and I/O bound, so overlapping them hides per-file
+        latency. Use this only around batches of path()/path_optional()
+        calls that don't immediately operate on the copied files.
+        """
+        return self.DeferredCopyBatch(self)
+
+    class DeferredCopyBatch(object):
+        def __init__(self, manifest):
+            self.manifest = manifest
+
+        def __enter__(self):
+            # A nested batch just keeps feeding the outermost queue, which
+            # drains everything when it exits.
+            self.outer = self.manifest.deferred_copies
+            if self.outer is None:
+                self.manifest.deferred_copies = []
+            return None
+
+        def __exit__(self, type, value, traceback):
+            manifest = self.manifest
+            deferred = manifest.deferred_copies
+            manifest.deferred_copies = self.outer
+            # Propagate exceptions (abandoning the queue) and let the
+            # outermost batch do the draining.
+            if type is not None or self.outer is not None or not deferred:
+                return False
+            # Directory creation is kept out of the pool: pre-create every
+            # target directory serially, then let the workers copy plain
+            # files into an already-complete tree.
+            for dstdir in set(os.path.dirname(dst) for src, dst in deferred):
+                manifest.cmakedirs(dstdir)
+            with concurrent.futures.ThreadPoolExecutor(
+                    max_workers=min(16, (os.cpu_count() or 4) * 2)) as pool:
+                for ignore in pool.map(lambda pair: manifest.ccopymumble(*pair),
+                                       deferred):
+                    pass
+            return False
+
     def end_prefix(self, descr=None):
         """Pops a prefix off the stack.  If given an argument, checks
         the argument against the top of the stack.  If the argument
@@ -476,24 +551,35 @@ class LLManifest(object, metaclass=LLManifestRegistry):
         artwork = self.artwork_prefix.pop()
         build = self.build_prefix.pop()
         dst = self.dst_prefix.pop()
+        self._prefix_cache.clear()
         if descr and not(src == descr or build == descr or dst == descr):
             raise ValueError("End prefix '" + descr + "' didn't match '" +src+ "' or '" +dst + "'")
 
+    def _get_prefix(self, stack):
+        """Returns (and caches) the joined prefix for the named stack. The
+        cache is cleared whenever any prefix stack changes."""
+        try:
+            return self._prefix_cache[stack]
+        except KeyError:
+            joined = self._prefix_cache[stack] = \
+                os.path.join(*getattr(self, stack))
+            return joined
+
     def get_src_prefix(self):
         """ Returns the current source prefix."""
-        return os.path.join(*self.src_prefix)
+        return self._get_prefix('src_prefix')
 
     def get_artwork_prefix(self):
         """ Returns the current artwork prefix."""
-        return os.path.join(*self.artwork_prefix)
+        return self._get_prefix('artwork_prefix')
 
     def get_build_prefix(self):
         """ Returns the current build prefix."""
-        return os.path.join(*self.build_prefix)
+        return self._get_prefix('build_prefix')
 
     def get_dst_prefix(self):
         """ Returns the current destination prefix."""
-        return os.path.join(*self.dst_prefix)
+        return self._get_prefix('dst_prefix')
 
     def src_path_of(self, relpath):
         """Returns the full path to a file or directory specified
@@ -585,8 +671,29 @@ class LLManifest(object, metaclass=LLManifestRegistry):
         # Why would we create a file in the destination tree if not to include
         # it in the installer? The default src=None (plus the fact that the
         # src param is last) is to preserve backwards compatibility.
+        # Normalize the dst like process_file() does; nsi_file_commands()
+        # relies on every file_list dst entry being in normpath form.
+        if src:
+            self.file_list.append([src, os.path.normpath(dst_path)])
+        return dst_path
+
+    def put_in_file_iter(self, pieces, dst, sep=b'', src=None):
+        """Like put_in_file(), but streams an iterable of bytes chunks,
+        joined by 'sep', through a buffered writer instead of requiring the
+        caller to build the joined contents in memory first."""
+        dst_path = self.dst_path_of(dst)
+        self.cmakedirs(os.path.dirname(dst_path))
+        with open(dst_path, 'wb', buffering=1<<18) as f:
+            first = True
+            for piece in pieces:
+                if first:
+                    first = False
+                elif sep:
+                    f.write(sep)
+                f.write(piece)
+
         if src:
-            self.file_list.append([src, dst_path])
+            self.file_list.append([src, os.path.normpath(dst_path)])
         return dst_path
 
     def replace_in(self, src, dst=None, searchdict={}):
@@ -595,14 +702,57 @@ class LLManifest(object, metaclass=LLManifestRegistry):
         # read src
         with open(self.src_path_of(src), "r") as f:
             contents = f.read()
-        # apply dict replacements
-        for old, new in searchdict.items():
-            contents = contents.replace(old, new)
+        # Apply all dict replacements in a single scan of the file rather
+        # than one full-file str.replace() pass per key. Keys never appear
+        # inside each other's replacement text, so this is equivalent (and
+        # avoids accidental re-substitution into substituted text).
+        if searchdict:
+            pattern = re.compile('|'.join(
+                re.escape(old) for old in
+                sorted(searchdict, key=len, reverse=True)))
+            contents = pattern.sub(lambda m: searchdict[m.group(0)], contents)
         self.put_in_file(contents.encode(), dst)
         self.created_paths.append(dst)
 
+    def replace_in_stream(self, src, dst=None, searchdict={}):
+        """Like replace_in(), but streams the template to the destination
+        line by line instead of materializing the substituted text. A
+        substitution value may be either a string or an iterable of lines
+        (without trailing newlines) that is written straight to the output
+        file -- use the latter for large generated blocks such as the NSI
+        install/delete file lists, which then never exist as one big
+        Python string."""
+        if dst == None:
+            dst = src
+        dst_path = self.dst_path_of(dst)
+        self.cmakedirs(os.path.dirname(dst_path))
+        pattern = re.compile('|'.join(
+            re.escape(old) for old in
+            sorted(searchdict, key=len, reverse=True)))
+        # newline='' so the output is byte-identical to replace_in()
+        with open(self.src_path_of(src), 'r') as template, \
+             open(dst_path, 'w', buffering=1<<18, newline='') as out:
+            for line in template:
+                last = 0
+                for found in pattern.finditer(line):
+                    out.write(line[last:found.start()])
+                    value = searchdict[found.group(0)]
+                    if isinstance(value, str):
+                        out.write(value)
+                    else:
+                        for piece in value:
+                            out.write(piece)
+                            out.write('\n')
+                    last = found.end()
+                out.write(line[last:])
+        self.created_paths.append(dst)
+
     def copy_action(self, src, dst):
         if src and (os.path.exists(src) or os.path.islink(src)):
+            if self.deferred_copies is not None:
+                self.created_paths.append(dst)
+                self.deferred_copies.append((src, dst))
+                return
             # ensure that destination path exists
             self.cmakedirs(os.path.dirname(dst))
             self.created_paths.append(dst)
@@ -685,7 +835,9 @@ class LLManifest(object, metaclass=LLManifestRegistry):
                 method = getattr(self, methodname, None)
                 if method is not None:
                     method(src, dst)
-            self.file_list.append([src, dst])
+            # normalize once at insertion so readers of file_list (e.g.
+            # nsi_file_commands) don't have to normpath per use
+            self.file_list.append([src, os.path.normpath(dst)])
             return 1
         else:
             sys.stdout.write(" (excluding %r, %r)" % (src, dst))
@@ -709,8 +861,16 @@ class LLManifest(object, metaclass=LLManifestRegistry):
 
     def includes(self, src, dst):
         if src:
-            for excl in self.excludes:
-                if fnmatch.fnmatch(src, excl):
+            if self._exclude_matchers is None:
+                # Compile the exclude globs once instead of letting
+                # fnmatch.fnmatch() re-resolve every pattern for every
+                # file tested. normcase on both sides matches fnmatch.
+                self._exclude_matchers = [
+                    re.compile(fnmatch.translate(os.path.normcase(excl))).match
+                    for excl in self.excludes]
+            normsrc = os.path.normcase(src)
+            for match in self._exclude_matchers:
+                if match(normsrc):
                     return False
         return True
 
@@ -724,7 +884,13 @@ class LLManifest(object, metaclass=LLManifestRegistry):
                     os.remove(path)
 
     def ccopymumble(self, src, dst):
-        """Copy a single symlink, file or directory."""
+        """Copy a single symlink, file or directory.
+
+        Symlinks are recreated, never dereferenced -- important for macOS
+        framework bundles, whose internal Versions/Current links would
+        otherwise be copied out as duplicate trees (and break codesigning
+        to boot). process_either() routes symlinked directories here as
+        files for the same reason."""
         if os.path.islink(src):
             linkto = os.readlink(src)
             if os.path.islink(dst) or os.path.isfile(dst):
@@ -740,16 +906,25 @@ class LLManifest(object, metaclass=LLManifestRegistry):
             # YYY would we put such things into a viewer package?!
 
     def ccopyfile(self, src, dst):
-        """ Copy a single file.  Uses filecmp to skip copying for existing files."""
-        # Don't recopy file if it's up-to-date.
-        # If we seem to be not not overwriting files that have been
-        # updated, set the last arg to False, but it will take longer.
+        """ Copy a single file.  Skips copying when the existing
+        destination already matches the source's (size, mtime) signature,
+        which ccopyfiledata preserves -- the destination tree itself is
+        the build-avoidance cache, keyed by stat."""
+        # Don't recopy file if it's up-to-date. One stat pair answers it;
+        # os.path.exists plus filecmp.cmp would stat the destination twice
+        # and grow filecmp's unbounded module-level signature cache.
 ##      reldst = (dst[len(self.dst_prefix[0]):]
 ##                if dst.startswith(self.dst_prefix[0])
 ##                else dst).lstrip(r'\/')
-        if os.path.exists(dst) and filecmp.cmp(src, dst, True):
-##          print "{} (skipping, {} exists)".format(src, reldst)
-            return
+        try:
+            st_src = os.stat(src)
+            st_dst = os.stat(dst)
+            if (st_src.st_size == st_dst.st_size
+                    and st_src.st_mtime == st_dst.st_mtime):
+##              print "{} (skipping, {} exists)".format(src, reldst)
+                return
+        except OSError:
+            pass    # destination missing: copy below
         # only copy if it's not excluded
         if self.includes(src, dst):
             try:
@@ -759,7 +934,40 @@ class LLManifest(object, metaclass=LLManifestRegistry):
                     raise
 
 ##          print "{} => {}".format(src, reldst)
-            shutil.copy2(src, dst)
+            self.ccopyfiledata(src, dst)
+
+    def ccopyfiledata(self, src, dst):
+        """Copy file contents plus metadata. Where the platform provides
+        os.copy_file_range() (Linux 4.5+), let the kernel move the data
+        directly between the two files instead of bouncing it through a
+        user-space buffer -- on CoW filesystems (btrfs, XFS) the kernel
+        satisfies it with an O(1) reflink, so the CEF payload costs no
+        data blocks at all. Otherwise (and for filesystems that refuse the
+        call, e.g. cross-device copies on older kernels) fall back to
+        shutil.copy2, whose fast path uses sendfile on Linux and fcopyfile
+        on macOS."""
+        if hasattr(os, 'copy_file_range'):
+            try:
+                with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+                    infd = fsrc.fileno()
+                    outfd = fdst.fileno()
+                    remaining = os.fstat(infd).st_size
+                    complete = True
+                    while remaining > 0:
+                        copied = os.copy_file_range(infd, outfd, remaining)
+                        if copied == 0:
+                            # premature EOF (source shrank underneath us?)
+                            # -- let shutil.copy2 below take over rather
+                            # than quietly keep a short copy
+                            complete = False
+                            break
+                        remaining -= copied
+                if complete:
+                    shutil.copystat(src, dst)
+                    return
+            except OSError:
+                pass
+        shutil.copy2(src, dst)
 
     def ccopytree(self, src, dst):
         """Direct copy of shutil.copytree with the additional
@@ -787,9 +995,29 @@ class LLManifest(object, metaclass=LLManifestRegistry):
         if you call it on an existing directory."""
 #        print "making path: ", path
         path = os.path.normpath(path)
+        # process_file() and the symlink helpers re-ensure the same parent
+        # directory for every entry they place in it; remember what has
+        # already been ensured (including ancestors makedirs created along
+        # the way) and skip the stat/mkdir chain for repeats.
+        if path in self._ensured_dirs:
+            return
         self.created_paths.append(path)
-        if not os.path.exists(path):
-            os.makedirs(path)
+        os.makedirs(path, exist_ok=True)
+        self._ensured_dirs.update(path_ancestors(path))
+
+    def _isfile(self, path):
+        """os.path.isfile() backed by a per-instance stat cache. The
+        installer-generation passes test the same destination files several
+        times (e.g. once for the install list and once for the uninstaller),
+        and on Windows each stat costs a kernel round trip."""
+        st = self._stat_cache.get(path)
+        if st is None:
+            try:
+                st = os.stat(path)
+            except OSError:
+                st = False
+            self._stat_cache[path] = st
+        return st is not False and stat.S_ISREG(st.st_mode)
 
     def find_existing_file(self, *list):
         for f in list:
@@ -810,12 +1038,21 @@ class LLManifest(object, metaclass=LLManifestRegistry):
         for member in tf.getmembers():
             tf.extract(member, self.ensure_dst_dir(dst_dir))
             # TODO get actions working on these dudes, perhaps we should extract to a temporary directory and then process_directory on it?
-            self.file_list.append([src_tar,
-                           self.dst_path_of(os.path.join(dst_dir,member.name))])
+            self.file_list.append([src_tar, os.path.normpath(
+                           self.dst_path_of(os.path.join(dst_dir,member.name)))])
         tf.close()
 
 
+    # The same globs (textures, xui, locale .paks, ...) are expanded over
+    # and over across prefixes and manifest instances; compile each
+    # src/dst pair only once.
+    _wildcard_cache = {}
+
     def wildcard_regex(self, src_glob, dst_glob):
+        try:
+            return self._wildcard_cache[(src_glob, dst_glob)]
+        except KeyError:
+            pass
         # assume src_glob of form "foo/*.bar"
         src_re = re.escape(src_glob)
         # <FS:Beq> fix up python 3.6 literal support
@@ -832,7 +1069,9 @@ class LLManifest(object, metaclass=LLManifestRegistry):
             dst_temp = dst_temp.replace('*', r'\g<' + str(i) + '>', 1)
             i = i + 1
             # </FS:Beq>
-        return re.compile(src_re), dst_temp
+        result = (re.compile(src_re), dst_temp)
+        self._wildcard_cache[(src_glob, dst_glob)] = result
+        return result
 
     def check_file_exists(self, path):
         if not os.path.exists(path) and not os.path.islink(path):
@@ -912,6 +1151,75 @@ class LLManifest(object, metaclass=LLManifestRegistry):
         # particular, let caller notice 0.
         return count
 
+    def _scandir_walk(self, root):
+        """Yield (relpath, DirEntry) for every file below 'root', using a
+        single os.scandir() pass per directory. Recursion is guarded on
+        DirEntry.is_dir(follow_symlinks=False), which on most platforms
+        answers from the directory entry itself without an extra stat()."""
+        stack = [(root, '')]
+        while stack:
+            dirpath, rel = stack.pop()
+            try:
+                entries = os.scandir(dirpath)
+            except OSError:
+                continue
+            with entries:
+                for entry in entries:
+                    entry_rel = (rel + '/' + entry.name) if rel else entry.name
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append((entry.path, entry_rel))
+                    else:
+                        yield entry_rel, entry
+
+    def path_patterns(self, *patterns):
+        """
+        Process a whole batch of glob patterns whose dst mirrors the src
+        relative path (i.e. the common self.path("*/foo/*.bar") case) in a
+        single recursive walk of each prefix directory, instead of
+        re-walking the tree once per pattern the way individual path()
+        calls would. Each pattern that matches nothing is reported as
+        missing, same as path() would.
+        """
+        sys.stdout.flush()
+        # Compile each glob to a regex ourselves rather than with
+        # fnmatch.translate(): glob '*' must not match across '/'.
+        compiled = [(pat, re.compile(re.escape(pat).replace(r'\*', '[^/]*')
+                                     + r'\Z').match)
+                    for pat in patterns]
+        counts = dict.fromkeys(patterns, 0)
+        dst_root = self.get_dst_prefix()
+        try_prefixes = [self.get_src_prefix(), self.get_artwork_prefix(), self.get_build_prefix()]
+        # Same as path(): for each pattern, the first prefix that produces
+        # any match owns that pattern; later prefixes don't contribute.
+        pattern_owner = {}
+        with self.deferred_copy_batch():
+            for pfx in dict.fromkeys(try_prefixes):    # dedupe, keep order
+                # Only patterns not owned by an earlier prefix are still in
+                # play here. Once every pattern has an owner there is
+                # nothing left for this prefix or any later one -- and the
+                # build prefix in particular can be the whole build tree,
+                # which we must not walk just to match nothing.
+                live = [item for item in compiled
+                        if item[0] not in pattern_owner]
+                if not live:
+                    break
+                for rel, entry in self._scandir_walk(pfx):
+                    for pat, match in live:
+                        if match(rel):
+                            pattern_owner.setdefault(pat, pfx)
+                            dst = os.path.join(dst_root, *rel.split('/'))
+                            counts[pat] += self.process_file(entry.path, dst)
+                            break
+        for pat in patterns:
+            count = counts[pat]
+            if count:
+                print("Processing %s => %s ... %d files" %
+                      (pat, self._relative_dst_path(os.path.join(dst_root, pat)), count))
+            else:
+                print(("\nunable to find '%s'; looked in:\n  %s" % (pat, '\n  '.join(try_prefixes))))
+                self.missing.append(MissingFile(pattern=pat, tried=try_prefixes))
+        return sum(counts.values())
+
     def path_optional(self, src, dst=None):
         sys.stdout.flush()
         if src == None:
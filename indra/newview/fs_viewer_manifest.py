@@ -1,3 +1,4 @@
+import functools
 import os
 import subprocess
 import tarfile
@@ -19,10 +20,15 @@ class FSViewerManifest:
 
         return "Phoenix-%(app_name)s_%(optimized)s-%(version_dashes)s" % substitution_strings
 
+    # Queried several times while building substitution dicts; the args
+    # never change after construction, so cache like the channel helpers
+    # in viewer_manifest.py.
+    @functools.cache
     def fs_is_opensim(self):
         return self.args['viewer_flavor'] == 'oss' #Havok would be hvk
+    @functools.cache
     def fs_is_avx2(self):
-        return self.args['avx2'] == 'ON' 
+        return self.args['avx2'] == 'ON'
 
     def fs_splice_grid_substitution_strings( self, subst_strings ):
         ret = subst_strings
@@ -26,7 +26,11 @@ Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301  USA
 Linden Research, Inc., 945 Battery Street, San Francisco, CA  94111  USA
 $/LicenseInfo$
 """
+import atexit
+import concurrent.futures
 import errno
+import fnmatch
+import functools
 import glob
 import itertools
 import json
@@ -36,15 +40,26 @@ import plistlib
 import random
 import re
 import secrets
+import shlex
 import shutil
+import stat
+import struct
 import subprocess
 import sys
 import tarfile
 import tempfile
 import time
+from xml.sax import saxutils
 
 sys.dont_write_bytecode = True # <FS:Ansariel> Prevents creating __pycache__ directory
 
+# Packaging copies thousands of assets through shutil; the default copy
+# buffer (64 KiB on POSIX) means needlessly many read/write syscalls per
+# large file (shaders, textures, dictionaries). 1 MiB measurably speeds up
+# the copy phase and costs nothing. Only relevant where shutil falls back
+# to its buffered loop; the zero-copy fast paths are unaffected.
+shutil.COPY_BUFSIZE = 1 << 20
+
 from fs_viewer_manifest import FSViewerManifest #<FS:ND/> Manifest extensions for Firestorm
 
 viewer_dir = os.path.dirname(__file__)
@@ -52,15 +67,144 @@ viewer_dir = os.path.dirname(__file__)
 # Put it FIRST because some of our build hosts have an ancient install of
 # indra.util.llmanifest under their system Python!
 sys.path.insert(0, os.path.join(viewer_dir, os.pardir, "lib", "python"))
-from indra.util.llmanifest import LLManifest, main, path_ancestors, CHANNEL_VENDOR_BASE, RELEASE_CHANNEL, ManifestError, MissingError
-# <FS:Beq> try to work around weird Mac build issue that seems to find the wrong python
-#import llsd
-try:
-    import llsd
-except ImportError:
-    from llbase import llsd
-# </FS:Beq>
+from indra.util.llmanifest import LLManifest, main, path_ancestors, CHANNEL_VENDOR_BASE, RELEASE_CHANNEL, ManifestError, MissingError, MissingFile
+# CHANNEL_VENDOR_BASE never changes at runtime; build the derived installer
+# base once instead of concatenating it on every installer_base_name() call.
+PHOENIX_CHANNEL_BASE = "Phoenix-" + CHANNEL_VENDOR_BASE
+# CEF ships one resource pak per locale. We deliberately keep an explicit
+# whitelist rather than globbing *.pak so that a new locale dropped into the
+# package doesn't silently change what we ship.
+CEF_LOCALE_PAKS = (
+    "am", "ar", "bg", "bn", "ca", "cs", "da", "de", "el", "en-GB", "en-US",
+    "es-419", "es", "et", "fa", "fi", "fil", "fr", "gu", "he", "hi", "hr",
+    "hu", "id", "it", "ja", "kn", "ko", "lt", "lv", "ml", "mr", "ms", "nb",
+    "nl", "pl", "pt-BR", "pt-PT", "ro", "ru", "sk", "sl", "sr", "sv", "sw",
+    "ta", "te", "th", "tr", "uk", "vi", "zh-CN", "zh-TW",
+)
+# MSVC runtime pieces installed next to the viewer binary and again beside
+# the CEF plugin host. The optional set varies with the toolset version, so
+# those are resolved with one glob pass each instead of a per-name probe.
+MSVC_RUNTIME_DLLS = ("msvcp140.dll", "vcruntime140.dll")
+MSVC_RUNTIME_OPTIONAL_GLOBS = ("msvcp140_*.dll", "vcruntime140_*.dll")
+
+def _link_or_copy(src, dst):
+    """Hardlink dst to src where the filesystem allows, sharing the data
+    blocks instead of duplicating them; fall back to a real copy across
+    devices or on filesystems without hardlinks. Only for destinations
+    that are never modified in place afterwards."""
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+# _symlinkf() runs its per-link syscalls relative to a cached fd on the
+# containing directory where the platform allows (symlinkat(2) and
+# friends), so loops placing many links in one directory don't make the
+# kernel re-walk the directory path for every link. Opened lazily,
+# closed in bulk at exit.
+_dir_fd_cache = {}
+# probed once: os.supports_dir_fd membership never changes at runtime,
+# and binding the two per-link syscalls here spares the os.<attr> lookup
+# each call makes on the hot path
+_SYMLINK_DIR_FD = (os.symlink in os.supports_dir_fd
+                   and os.readlink in os.supports_dir_fd)
+_readlink = os.readlink
+_symlink = os.symlink
+_EEXIST = errno.EEXIST
+
+def _dir_fd(path):
+    fd = _dir_fd_cache.get(path)
+    if fd is None:
+        fd = _dir_fd_cache[path] = os.open(
+            path, os.O_RDONLY | getattr(os, 'O_DIRECTORY', 0))
+    return fd
+
+@atexit.register
+def _close_dir_fds():
+    while _dir_fd_cache:
+        os.close(_dir_fd_cache.popitem()[1])
+def read_dylib_id(path):
+    """Return the install name stamped into a Mach-O dylib (its
+    LC_ID_DYLIB load command), as objdump --dylib-id would print it, but
+    without the fork/exec: the id lives in the load commands right after
+    the header, so a small in-process read suffices. Raises ManifestError
+    if the file isn't a dylib."""
+    LC_ID_DYLIB = 0xd
+    with open(path, 'rb') as macho:
+        data = macho.read(1 << 16)
+        magic = struct.unpack_from('>I', data, 0)[0]
+        if magic in (0xcafebabe, 0xcafebabf):
+            # universal (fat) binary: descend into the first slice; the id
+            # is the same in every architecture
+            if magic == 0xcafebabe:
+                offset = struct.unpack_from('>5I', data, 8)[2]
+            else:
+                offset = struct.unpack_from('>2I2Q2I', data, 8)[2]
+            macho.seek(offset)
+            data = macho.read(1 << 16)
+        magic = struct.unpack_from('<I', data, 0)[0]
+        if magic in (0xfeedface, 0xfeedfacf):
+            endian = '<'
+        elif magic in (0xcefaedfe, 0xcffaedfe):
+            endian = '>'
+        else:
+            raise ManifestError("%s is not a Mach-O file" % path)
+        is64 = magic in (0xfeedfacf, 0xcffaedfe)
+        ncmds, sizeofcmds = struct.unpack_from(endian + '2I', data, 16)
+        pos = 32 if is64 else 28
+        # make sure the whole load-command table is in the buffer
+        needed = pos + sizeofcmds
+        if len(data) < needed:
+            data += macho.read(needed - len(data))
+        for ignore in range(ncmds):
+            cmd, cmdsize = struct.unpack_from(endian + '2I', data, pos)
+            if cmd == LC_ID_DYLIB:
+                name_offset = struct.unpack_from(endian + 'I', data, pos + 8)[0]
+                name = data[pos + name_offset : pos + cmdsize]
+                return name.split(b'\0', 1)[0].decode()
+            pos += cmdsize
+    raise ManifestError("no LC_ID_DYLIB load command in %s" % path)
+
+# Download page advertised by the installer, by channel type.
+_DL_URLS = {
+    'release':   'https://www.firestormviewer.org/choose-your-platform',
+    'beta':      'https://www.firestormviewer.org/early-access-beta-downloads',
+    'alpha':     'https://www.firestormviewer.org/early-access-alpha-downloads',
+    'manual':    'https://www.firestormviewer.org/early-access-manual-downloads',
+    'profiling': 'https://www.firestormviewer.org/profiling-downloads',
+    'nightly':   'https://www.firestormviewer.org/firestorm-nightly-build-downloads',
+}
+# os.path.realpath/abspath walk or normalize the same handful of build and
+# destination directories thousands of times while packaging; memoize them.
+# The caches are cleared at the start of construct() in case an earlier
+# action created or moved directories.
+_abspath = functools.lru_cache(maxsize=4096)(os.path.abspath)
+
+@functools.lru_cache(maxsize=4096)
+def _realpath(path):
+    """os.path.realpath with parent composition: when the entry itself is
+    not a symlink its realpath is just the parent's realpath plus the
+    basename, so siblings under an already-resolved directory cost one
+    lstat instead of a walk over every path component."""
+    head, tail = os.path.split(path)
+    if head and tail and tail not in (os.curdir, os.pardir) \
+       and not os.path.islink(path):
+        return os.path.join(_realpath(head), tail)
+    return os.path.realpath(path)
+
 class ViewerManifest(LLManifest,FSViewerManifest):
+    def __init__(self, args):
+        super(ViewerManifest, self).__init__(args)
+        # The tree roots never change for the lifetime of a manifest
+        # instance. os.path.realpath() does an lstat per path component,
+        # so resolve the roots once here instead of re-walking them for
+        # every relpath()/symlink call during construct().
+        self._real_roots = {root: os.path.realpath(root)
+                            for root in (args['source'], args['artwork'],
+                                         args['build'], args['dest'])}
+        # memoized (path, base, symlink) -> relative path; see relpath()
+        self._relpath_cache = {}
+
     def is_packaging_viewer(self):
         # Some commands, files will only be included
         # if we are packaging the viewer on windows.
@@ -71,28 +215,34 @@ class ViewerManifest(LLManifest,FSViewerManifest):
 
     def construct(self):
         super(ViewerManifest, self).construct()
+        _realpath.cache_clear()
+        _abspath.cache_clear()
         self.path(src="../../scripts/messages/message_template.msg", dst="app_settings/message_template.msg")
         self.path(src="../../etc/message.xml", dst="app_settings/message.xml")
         
-        # <FS:LO> Copy dictionaries to a place where the viewer can find them if ran from visual studio
+        # Dispatch the packaged subtrees to their destinations from a single
+        # os.scandir() pass over pkgdir, instead of opening pkgdir once per
+        # subtree through separate prefix/path blocks:
+        #   dictionaries - <FS:LO> copy to a place where the viewer can find
+        #                  them if ran from visual studio
+        #   js           - <FS:Ansariel> 360 snapshot JavaScripts
+        #   fonts        - <FS:Ansariel> 3p fonts for the build output
+        #   xui          - <FS:Ansariel> emoji characters for the build output
         pkgdir = os.path.join(self.args['build'], os.pardir, 'packages')
-        with self.prefix(src=pkgdir, dst="app_settings"):
-            self.path("dictionaries")
-
-        # <FS:Ansariel> Copy 360 snapshot JavaScripts
-        with self.prefix(src=pkgdir, dst="skins/default/html/common/equirectangular"):
-            self.path("js")
-        # </FS:Ansariel>
-
-        # <FS:Ansariel> Copy 3p fonts to build output
-        with self.prefix(src=pkgdir):
-            self.path("fonts")
-        # </FS:Ansariel>
-
-        # <FS:Ansariel> Copy emoji characters to build output
-        with self.prefix(src=pkgdir, dst="skins/default"):
-            self.path("xui")
-        # </FS:Ansariel>
+        pkg_subtrees = {
+            "dictionaries": "app_settings/dictionaries",
+            "js":           "skins/default/html/common/equirectangular/js",
+            "fonts":        "fonts",
+            "xui":          "skins/default/xui",
+            }
+        try:
+            pkg_entries = {entry.name: entry.path for entry in os.scandir(pkgdir)}
+        except OSError:
+            pkg_entries = {}
+        for name, dst in pkg_subtrees.items():
+            # a missing subtree is recorded by path() via self.missing
+            self.path(src=pkg_entries.get(name, os.path.join(pkgdir, name)),
+                      dst=dst)
 
         if self.is_packaging_viewer():
             with self.prefix(src_dst="app_settings"):
@@ -106,7 +256,9 @@ class ViewerManifest(LLManifest,FSViewerManifest):
                 # include the extracted list of contributors
                 contributions_path = os.path.join(self.args['source'], "..", "..", "doc", "contributions.txt")
                 contributor_names = self.extract_names(contributions_path)
-                self.put_in_file(contributor_names.encode(), "contributors.txt", src=contributions_path)
+                self.put_in_file_iter((name.encode() for name in contributor_names),
+                                      "contributors.txt", sep=b', ',
+                                      src=contributions_path)
 
                 # ... and the default camera position settings
                 self.path("camera")
@@ -172,7 +324,7 @@ class ViewerManifest(LLManifest,FSViewerManifest):
 
                 # put_in_file(src=) need not be an actual pathname; it
                 # only needs to be non-empty
-                self.put_in_file(llsd.format_pretty_xml(settings_install),
+                self.put_in_file(self.format_settings_install(settings_install),
                                  "settings_install.xml",
                                  src="environment")
 
@@ -201,36 +353,38 @@ class ViewerManifest(LLManifest,FSViewerManifest):
                 self.path("*.xml")
 
             # skins
+            # Every dst below mirrors its src relative path, so instead of
+            # issuing one overlapping glob per pattern (each of which
+            # re-walks the whole skins tree), do a single os.scandir() walk
+            # and classify each file against the pattern table once.
             with self.prefix(src_dst="skins"):
-                    self.path("skins.xml")
-                    # include the entire textures directory recursively
-                    with self.prefix(src_dst="*/textures"):
-                            self.path("*/*.tga") # <FS:Ansariel> Needed for legacy icons
-                            self.path("*/*.jpg")
-                            self.path("*/*.png")
-                            self.path("*.tga")
-                            self.path("*.j2c")
-                            self.path("*.jpg") # <FS:Ansariel> Needed for Firestorm
-                            self.path("*.png")
-                            self.path("textures.xml")
-                    self.path("*/xui/*/*.xml")
-                    self.path("*/xui/*/widgets/*.xml")
-                    self.path("*/themes/*/colors.xml")
-                    with self.prefix(src_dst="*/themes/*/textures"):
-                        self.path("*/*.tga")
-                        self.path("*/*.jpg")
-                        self.path("*/*.png")
-                        self.path("*.tga")
-                        self.path("*.j2c")
-                        self.path("*.png")
-                    self.path("*/*.xml")
-
-                    # Update: 2017-11-01 CP Now we store app code in the html folder
-                    #         Initially the HTML/JS code to render equirectangular
-                    #         images for the 360 capture feature but more to follow.
-                    with self.prefix(src="*/html", dst="*/html"):
-                        #self.path("*/*/*/*.js") # <FS:Ansariel> Copied outside packaging and from packages directory already
-                        self.path("*/*/*.html")
+                    self.path_patterns(
+                        "skins.xml",
+                        # the entire textures directory
+                        "*/textures/*/*.tga", # <FS:Ansariel> Needed for legacy icons
+                        "*/textures/*/*.jpg",
+                        "*/textures/*/*.png",
+                        "*/textures/*.tga",
+                        "*/textures/*.j2c",
+                        "*/textures/*.jpg", # <FS:Ansariel> Needed for Firestorm
+                        "*/textures/*.png",
+                        "*/textures/textures.xml",
+                        "*/xui/*/*.xml",
+                        "*/xui/*/widgets/*.xml",
+                        "*/themes/*/colors.xml",
+                        "*/themes/*/textures/*/*.tga",
+                        "*/themes/*/textures/*/*.jpg",
+                        "*/themes/*/textures/*/*.png",
+                        "*/themes/*/textures/*.tga",
+                        "*/themes/*/textures/*.j2c",
+                        "*/themes/*/textures/*.png",
+                        "*/*.xml",
+
+                        # Update: 2017-11-01 CP Now we store app code in the html folder
+                        #         Initially the HTML/JS code to render equirectangular
+                        #         images for the 360 capture feature but more to follow.
+                        #"*/html/*/*/*/*.js", # <FS:Ansariel> Copied outside packaging and from packages directory already
+                        "*/html/*/*/*.html")
 
             #build_data.json.  Standard with exception handling is fine.  If we can't open a new file for writing, we have worse problems
             #platform is computed above with other arg parsing
@@ -246,8 +400,18 @@ class ViewerManifest(LLManifest,FSViewerManifest):
             if bugsplat_db:
                 build_data_dict["BugSplat DB"] = bugsplat_db
             build_data_dict = self.finish_build_data_dict(build_data_dict)
-            with open(os.path.join(os.pardir,'build_data.json'), 'w') as build_data_handle:
-                json.dump(build_data_dict,build_data_handle)
+            # json.dump() drips the document through the file object's
+            # write() in small pieces; serialize first and emit the whole
+            # thing with a single write syscall. (This write can't be
+            # deferred past construct(): LinuxManifest picks build_data.json
+            # up again immediately after super().construct().)
+            build_data = json.dumps(build_data_dict).encode()
+            build_data_fd = os.open(os.path.join(os.pardir,'build_data.json'),
+                                    os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+            try:
+                os.write(build_data_fd, build_data)
+            finally:
+                os.close(build_data_fd)
 
             #we likely no longer need the test, since we will throw an exception above, but belt and suspenders and we get the
             #return code for free.
@@ -257,12 +421,35 @@ class ViewerManifest(LLManifest,FSViewerManifest):
     def finish_build_data_dict(self, build_data_dict):
         return build_data_dict
 
+    def format_settings_install(self, settings):
+        """Serialize the settings_install dict as LLSD XML. The dict shape is
+        fixed (a map of maps with string and integer leaves only), so emit it
+        directly instead of going through the generic llsd serializer."""
+        parts = ['<?xml version="1.0" ?>\n<llsd>\n<map>\n']
+        for key, setting in settings.items():
+            parts.append('  <key>%s</key>\n  <map>\n' % saxutils.escape(key))
+            for name, value in setting.items():
+                if isinstance(value, int):
+                    parts.append('    <key>%s</key>\n    <integer>%d</integer>\n'
+                                 % (saxutils.escape(name), value))
+                else:
+                    parts.append('    <key>%s</key>\n    <string>%s</string>\n'
+                                 % (saxutils.escape(name), saxutils.escape(value)))
+            parts.append('  </map>\n')
+        parts.append('</map>\n</llsd>\n')
+        return ''.join(parts).encode()
+
     def grid(self):
         return self.args['grid']
 
     def channel(self):
         return self.args['channel']
 
+    # The channel/app-name helpers below depend only on self.args, which is
+    # fixed for the lifetime of the instance, yet they are called all over
+    # construct() and package_finish(). functools.cache makes each of them
+    # do its string surgery once per manifest instance.
+    @functools.cache
     def channel_with_pkg_suffix(self):
         fullchannel=self.channel()
         channel_suffix = self.args.get('channel_suffix')
@@ -270,10 +457,11 @@ class ViewerManifest(LLManifest,FSViewerManifest):
             fullchannel+=' '+channel_suffix
         return fullchannel
 
+    @functools.cache
     def channel_variant(self):
-        global CHANNEL_VENDOR_BASE
         return self.channel().replace(CHANNEL_VENDOR_BASE, "").strip()
 
+    @functools.cache
     def channel_type(self): # returns 'release', 'beta', 'project', or 'test'
         channel_qualifier=self.channel_variant().lower()
         #<FS:TS> Somehow, we started leaving the - separating the variant from the app name
@@ -302,6 +490,7 @@ class ViewerManifest(LLManifest,FSViewerManifest):
             channel_type='private'
         return channel_type
 
+    @functools.cache
     def channel_variant_app_suffix(self):
         # get any part of the channel name after the CHANNEL_VENDOR_BASE
         suffix=self.channel_variant()
@@ -319,11 +508,11 @@ class ViewerManifest(LLManifest,FSViewerManifest):
         suffix = "_".join([suffix] + self.args.get('channel_suffix', '').split())
         return suffix
 
+    @functools.cache
     def installer_base_name(self):
-        global CHANNEL_VENDOR_BASE
         # a standard map of strings for replacing in the templates
         #<FS:TS> tag "OS" after CHANNEL_VENDOR_BASE and before any suffix
-        channel_base = "Phoenix-" + CHANNEL_VENDOR_BASE
+        channel_base = PHOENIX_CHANNEL_BASE
         if self.fs_is_opensim():
             channel_base = channel_base + "OS"
         #</FS:TS>
@@ -335,8 +524,8 @@ class ViewerManifest(LLManifest,FSViewerManifest):
             }
         return "%(channel_vendor_base)s%(channel_variant_underscores)s_%(version_underscores)s_%(arch)s" % substitution_strings
 
+    @functools.cache
     def app_name(self):
-        global CHANNEL_VENDOR_BASE
         channel_type=self.channel_type()
         #<FS:TS> LL uses "Viewer" in the name of their release package. We use "Release".
         #if channel_type == 'release':
@@ -355,20 +544,32 @@ class ViewerManifest(LLManifest,FSViewerManifest):
         return CHANNEL_VENDOR_BASE + app_suffix
         #</FS:ND>
 
+    @functools.cache
     def exec_name(self):
         # <FS:Ansariel> Same as app_name_oneword()
         #return "SecondLifeViewer"
         return ''.join(self.app_name().split())
 
+    @functools.cache
     def app_name_oneword(self):
         return ''.join(self.app_name().split())
 
     # <FS:Ansariel> FIRE-30446: Set FriendlyAppName for protocol registrations
     def friendly_app_name(self):
-        global CHANNEL_VENDOR_BASE
         return CHANNEL_VENDOR_BASE
     # </FS:Ansariel>
 
+    def paths(self, filenames, src='', build='', dst='', src_dst=None):
+        """Copy a fixed batch of files under a single prefix push: one
+        prefix push/pop for the whole batch instead of a with-block whose
+        per-file path() calls each re-join the prefix stacks. Returns the
+        total number of files processed."""
+        count = 0
+        with self.prefix(src=src, build=build, dst=dst, src_dst=src_dst):
+            for f in filenames:
+                count += self.path(f)
+        return count
+
     def icon_path(self):
         # <FS:ND> Add -os for oss builds
         chan = self.channel_type()
@@ -380,28 +581,48 @@ class ViewerManifest(LLManifest,FSViewerManifest):
         # </FS:ND>
         return "icons/" + chan
 
+    # The manifest may be instantiated several times within a single build
+    # (e.g. for additional_packages), so memoize the parsed contributors
+    # file. Keyed on mtime as well as path so an edited file reparses.
+    _contrib_cache = {}
+
     def extract_names(self,src):
-        """Extract contributor names from source file, returns string"""
+        """Extract contributor names from source file, returns a sequence
+        of names so the caller can stream them out without another giant
+        joined string"""
+        try:
+            cache_key = (src, os.stat(src).st_mtime_ns)
+        except OSError:
+            print("Failed to open '%s'" % src)
+            raise
+        try:
+            return self._contrib_cache[cache_key]
+        except KeyError:
+            pass
+
         try:
             with open(src, 'r') as contrib_file:
-                lines = contrib_file.readlines()
+                # All lines up to and including the first blank line are the
+                # file header; skip them as we stream past
+                for line in contrib_file:
+                    if not line.strip():
+                        break
+
+                # A line that starts with a non-whitespace character is a
+                # name; all others describe contributions, so collect the
+                # names. line[:1].strip() is the cheap equivalent of
+                # re.match(r"\S", line).
+                names = [line.rstrip() for line in contrib_file if line[:1].strip()]
         except IOError:
             print("Failed to open '%s'" % src)
             raise
-
-        # All lines up to and including the first blank line are the file header; skip them
-        lines.reverse() # so that pop will pull from first to last line
-        while not re.match(r"\s*$", lines.pop()) :
-            pass # do nothing
-
-        # A line that starts with a non-whitespace character is a name; all others describe contributions, so collect the names
-        names = []
-        for line in lines :
-            if re.match(r"\S", line) :
-                names.append(line.rstrip())
-        # It's not fair to always put the same people at the head of the list
-        random.shuffle(names)
-        return ', '.join(names)
+        # It's not fair to always put the same people at the head of the list.
+        # Use a throwaway Random instance: the module-level shuffle goes
+        # through the shared singleton's global state on every swap.
+        random.Random().shuffle(names)
+        result = tuple(names)
+        self._contrib_cache[cache_key] = result
+        return result
 
     def relsymlinkf(self, src, dst=None, catch=True):
         """
@@ -463,38 +684,67 @@ class ViewerManifest(LLManifest,FSViewerManifest):
         if os.path.isabs(src):
             raise ManifestError("Do not symlinkf(absolute %r, asis=True)" % src)
 
+        # Resolve the containing directory once: with dir_fd support the
+        # remaining syscalls take the link's basename relative to a cached
+        # directory fd, so the kernel skips the per-component path walk.
+        if _SYMLINK_DIR_FD:
+            dstdir, link = os.path.split(dst)
+            dir_fd = _dir_fd(dstdir or os.curdir)
+        else:
+            link = dst
+            dir_fd = None
+
+        # On incremental repackaging the requested link usually already
+        # exists; answer that case with one readlink(2) instead of an
+        # lstat chain or letting _symlink() construct and raise an
+        # EEXIST OSError every time.
+        try:
+            if _readlink(link, dir_fd=dir_fd) == src:
+                return
+        except OSError:
+            # missing, or present but not a symlink: create/replace below
+            pass
+
         # The outer catch is the one that reports failure even after attempted
         # recovery.
         try:
             # At the inner layer, recovery may be possible.
             try:
-                os.symlink(src, dst)
+                _symlink(src, link, dir_fd=dir_fd)
             except OSError as err:
-                if err.errno != errno.EEXIST:
+                if err.errno != _EEXIST:
                     raise
                 # We could just blithely attempt to remove and recreate the target
                 # file, but that strategy doesn't work so well if we don't have
                 # permissions to remove it. Check to see if it's already the
-                # symlink we want, which is the usual reason for EEXIST.
-                elif os.path.islink(dst):
-                    if os.readlink(dst) == src:
+                # symlink we want, which is the usual reason for EEXIST. One
+                # lstat() tells us what's in the way; the islink/isdir/exists
+                # chain would redo that stat for every test.
+                mode = os.lstat(link, dir_fd=dir_fd).st_mode
+                if stat.S_ISLNK(mode):
+                    if _readlink(link, dir_fd=dir_fd) == src:
                         # the requested link already exists
                         pass
                     else:
                         # dst is the wrong symlink; attempt to remove and recreate it
-                        os.remove(dst)
-                        os.symlink(src, dst)
-                elif os.path.isdir(dst):
+                        os.remove(link, dir_fd=dir_fd)
+                        _symlink(src, link, dir_fd=dir_fd)
+                elif stat.S_ISDIR(mode):
+                    # a real directory -- the lstat above means a symlink
+                    # to one lands in the S_ISLNK branch instead, so this
+                    # can never traverse through a link. An empty one
+                    # costs a single rmdir(2) rather than rmtree's
+                    # recursive walk.
                     print("Requested symlink (%s) exists but is a directory; replacing" % dst)
-                    shutil.rmtree(dst)
-                    os.symlink(src, dst)
-                elif os.path.exists(dst):
-                    print("Requested symlink (%s) exists but is a file; replacing" % dst)
-                    os.remove(dst)
-                    os.symlink(src, dst)
+                    try:
+                        os.rmdir(dst)
+                    except OSError:
+                        shutil.rmtree(dst)
+                    _symlink(src, link, dir_fd=dir_fd)
                 else:
-                    # out of ideas
-                    raise
+                    print("Requested symlink (%s) exists but is a file; replacing" % dst)
+                    os.remove(link, dir_fd=dir_fd)
+                    _symlink(src, link, dir_fd=dir_fd)
         except Exception as err:
             # report
             print("Can't symlink %r -> %r: %s: %s" % \
@@ -514,17 +764,29 @@ class ViewerManifest(LLManifest,FSViewerManifest):
         if base is None:
             base = self.get_dst_prefix()
 
+        # The Dullahan helper loop and media plugin fixups request the same
+        # few (path, base) combinations over and over; the answer is pure
+        # string work over paths that don't change while we run, so memoize.
+        key = (path, base, symlink)
+        cached = self._relpath_cache.get(key)
+        if cached is not None:
+            return cached
+
         # Since we use os.path.relpath() for this, which is purely textual, we
         # must ensure that both pathnames are absolute.
         if symlink:
             # symlink=True means: we know path is (or indirects through) a
             # symlink, don't resolve, we want to use the symlink.
-            abspath = os.path.abspath
+            abspath = _abspath
         else:
-            # symlink=False means to resolve any symlinks we may find
-            abspath = os.path.realpath
+            # symlink=False means to resolve any symlinks we may find,
+            # answering from the pre-resolved roots where possible
+            def abspath(p, cache=self._real_roots):
+                return cache.get(p) or _realpath(p)
 
-        return os.path.relpath(abspath(path), abspath(base))
+        result = os.path.relpath(abspath(path), abspath(base))
+        self._relpath_cache[key] = result
+        return result
 
     # <FS:Ansariel> Undo Github-Build stuff - I don't think we need this
     #def set_github_output_path(self, variable, path):
@@ -551,9 +813,26 @@ class Windows_x86_64_Manifest(ViewerManifest):
     build_data_json_platform = 'win'
     address_size = 64
 
+    @functools.cache
     def final_exe(self):
         return self.exec_name()+".exe"
 
+    def ccopyfiledata(self, src, dst):
+        """On a real Windows host, hand the copy to kernel32's CopyFileW:
+        one call moves the data and the timestamps/attributes entirely in
+        kernel space (and can block-clone on ReFS), where shutil.copy2 does
+        buffered user-space reads plus a separate copystat. Under cygwin or
+        if the call fails, fall back to the base implementation."""
+        if sys.platform == 'win32':
+            try:
+                import ctypes
+                # final False: overwrite an existing destination
+                if ctypes.windll.kernel32.CopyFileW(src, dst, False):
+                    return
+            except (AttributeError, OSError):
+                pass
+        super().ccopyfiledata(src, dst)
+
     def finish_build_data_dict(self, build_data_dict):
         build_data_dict['Executable'] = self.final_exe()
         build_data_dict['AppName']    = self.app_name()
@@ -615,10 +894,14 @@ class Windows_x86_64_Manifest(ViewerManifest):
         pkgdir = os.path.join(self.args['build'], os.pardir, 'packages')
         relpkgdir = os.path.join(pkgdir, "lib", "release")
         debpkgdir = os.path.join(pkgdir, "lib", "debug")
+        # staging directory for shared libs; used by two prefix blocks below
+        sharedlibs_dir = os.path.join(self.args['build'], os.pardir,
+                                      'sharedlibs', self.args['buildtype'])
+        configuration = self.args['configuration']
 
         if self.is_packaging_viewer():
             # Find firestorm-bin.exe in the 'configuration' dir, then rename it to the result of final_exe.
-            self.path(src='%s/firestorm-bin.exe' % self.args['configuration'], dst=self.final_exe())
+            self.path(src='%s/firestorm-bin.exe' % configuration, dst=self.final_exe())
             # Emit the whole app image as one of the GitHub step outputs. We
             # want the whole app -- but NOT the extraneous build products that
             # get tossed into the same directory, such as the installer and
@@ -661,197 +944,159 @@ class Windows_x86_64_Manifest(ViewerManifest):
 
             # </FS:Ansariel> Remove VMP
 
-        # Plugin host application
-        self.path2basename(os.path.join(os.pardir,
-                                        'llplugin', 'slplugin', self.args['configuration']),
-                           "slplugin.exe")
+        # The batches below are plain independent file copies with no
+        # ordering constraints between them, so queue them up and let a
+        # thread pool overlap the I/O.
+        with self.deferred_copy_batch():
+            # Plugin host application
+            self.path2basename(os.path.join(os.pardir,
+                                            'llplugin', 'slplugin', configuration),
+                               "slplugin.exe")
+
+            # Get shared libs from the shared libs staging directory
+            with self.prefix(src=sharedlibs_dir):
+                # One scandir of the staging directory replaces the
+                # per-name (or per-glob) filesystem probes path_optional
+                # would make for each optional library below.
+                try:
+                    present = {f.name for f in os.scandir(self.get_src_prefix())}
+                except OSError:
+                    present = set()
+                def path_if_present(pattern):
+                    if fnmatch.filter(present, pattern):
+                        return self.path(pattern)
+                    print("Skipping %s" % pattern)
+                    return 0
 
-        # Get shared libs from the shared libs staging directory
-        with self.prefix(src=os.path.join(self.args['build'], os.pardir,
-                                          'sharedlibs', self.args['buildtype'])):
-            # WebRTC libraries
-            for libfile in (
-                    'llwebrtc.dll',
-            ):
-                self.path(libfile)
+                # WebRTC libraries
+                for libfile in (
+                        'llwebrtc.dll',
+                ):
+                    self.path(libfile)
 
 
-            # Mesh 3rd party libs needed for auto LOD and collada reading
-            try:
-                self.path("glod.dll")
-            except RuntimeError as err:
-                print (err.message)
-                print ("Skipping GLOD library (assumming linked statically)")
+                # Mesh 3rd party libs needed for auto LOD and collada reading
+                try:
+                    self.path("glod.dll")
+                except RuntimeError as err:
+                    # err.message was Py2-only; on Py3 it raised a second
+                    # AttributeError inside this handler
+                    print (err)
+                    print ("Skipping GLOD library (assumming linked statically)")
+
+                # Get fmodstudio dll if needed
+                # if self.args['fmodstudio'] == 'ON':
+                if self.args['fmodstudio'].lower() == 'on':
+                    if(self.args['buildtype'].lower() == 'debug'):
+                        self.path("fmodL.dll")
+                    else:
+                        self.path("fmod.dll")
 
-            # Get fmodstudio dll if needed
-            # if self.args['fmodstudio'] == 'ON':
-            if self.args['fmodstudio'].lower() == 'on':
-                if(self.args['buildtype'].lower() == 'debug'):
-                    self.path("fmodL.dll")
-                else:
-                    self.path("fmod.dll")
-
-            # if self.args['openal'] == 'ON':
-            if self.args['openal'].lower() == 'on':
-                # Get openal dll
-                self.path("OpenAL32.dll")
-                self.path("alut.dll")
-
-            # For textures
-            self.path_optional("openjp2.dll")
-
-            # These need to be installed as a SxS assembly, currently a 'private' assembly.
-            # See http://msdn.microsoft.com/en-us/library/ms235291(VS.80).aspx
-            self.path("msvcp140.dll")
-            self.path_optional("msvcp140_1.dll")
-            self.path_optional("msvcp140_2.dll")
-            self.path_optional("msvcp140_atomic_wait.dll")
-            self.path_optional("msvcp140_codecvt_ids.dll")
-            self.path("vcruntime140.dll")
-            self.path_optional("vcruntime140_1.dll")
-            self.path_optional("vcruntime140_threads.dll")
-
-            # SLVoice executable
-            with self.prefix(src=os.path.join(pkgdir, 'bin', 'release')):
-                self.path("SLVoice.exe")
-
-            # Vivox libraries
-            self.path("vivoxsdk_x64.dll")
-            self.path("ortp_x64.dll")
-
-            # BugSplat
-            if self.args.get('bugsplat'):
-                self.path("BsSndRpt64.exe")
-                self.path("BugSplat64.dll")
-                self.path("BugSplatRc64.dll")
-
-            if self.args['tracy'] == 'ON':
-                with self.prefix(src=os.path.join(pkgdir, 'bin')):
-                    self.path("tracy-profiler.exe")
-
-            # Growl
-            self.path("growl.dll")
-            self.path("growl++.dll")
-
-            # <FS:ND> Copy symbols for breakpad
-            #self.path("ssleay32.pdb")
-            #self.path("libeay32.pdb")
-            #self.path("growl.pdb")
-            #self.path("growl++.pdb")
-            #self.path('apr-1.pdb', 'libarp.pdb')
-            #self.path('aprutil-1.pdb', 'libaprutil.pdb')
-            # </FS:ND>
+                # if self.args['openal'] == 'ON':
+                if self.args['openal'].lower() == 'on':
+                    # Get openal dll
+                    self.path("OpenAL32.dll")
+                    self.path("alut.dll")
 
-        self.path(src="licenses-win32.txt", dst="licenses.txt")
-        self.path("featuretable.txt")
-        self.path("cube.dae")
-
-        with self.prefix(src=pkgdir):
-            self.path("ca-bundle.crt")
-        self.path("VivoxAUP.txt")
-
-        # Media plugins - CEF
-        with self.prefix(dst="llplugin"):
-            with self.prefix(src=os.path.join(self.args['build'], os.pardir, 'media_plugins')):
-                with self.prefix(src=os.path.join('cef', self.args['configuration'])):
-                    self.path("media_plugin_cef.dll")
-
-                # Media plugins - LibVLC
-                with self.prefix(src=os.path.join('libvlc', self.args['configuration'])):
-                    self.path("media_plugin_libvlc.dll")
-
-                # Media plugins - Example (useful for debugging - not shipped with release viewer)
-                # <FS:Ansariel> Don't package example plugin
-                #if self.channel_type() != 'release':
-                #    with self.prefix(src=os.path.join('example', self.args['configuration'])):
-                #        self.path("media_plugin_example.dll")
-
-            # CEF runtime files - debug
-            # CEF runtime files - not debug (release, relwithdebinfo etc.)
-            config = 'debug' if self.args['configuration'].lower() == 'debug' else 'release'
-            with self.prefix(src=os.path.join(pkgdir, 'bin', config)):
-                self.path("chrome_elf.dll")
-                self.path("d3dcompiler_47.dll")
-                self.path("libcef.dll")
-                self.path("libEGL.dll")
-                self.path("libGLESv2.dll")
-                self.path("dullahan_host.exe")
-                self.path("snapshot_blob.bin")
-                self.path("v8_context_snapshot.bin")
-
-            # MSVC DLLs needed for CEF and have to be in same directory as plugin
-            with self.prefix(src=os.path.join(self.args['build'], os.pardir,
-                                              'sharedlibs', self.args['buildtype'])):
-                self.path("msvcp140.dll")
-                self.path("vcruntime140.dll")
-                self.path_optional("vcruntime140_1.dll")
-
-            # CEF files common to all configurations
-            with self.prefix(src=os.path.join(pkgdir, 'resources')):
-                self.path("chrome_100_percent.pak")
-                self.path("chrome_200_percent.pak")
-                self.path("resources.pak")
-                self.path("icudtl.dat")
-
-            with self.prefix(src=os.path.join(pkgdir, 'resources', 'locales'), dst='locales'):
-                self.path("am.pak")
-                self.path("ar.pak")
-                self.path("bg.pak")
-                self.path("bn.pak")
-                self.path("ca.pak")
-                self.path("cs.pak")
-                self.path("da.pak")
-                self.path("de.pak")
-                self.path("el.pak")
-                self.path("en-GB.pak")
-                self.path("en-US.pak")
-                self.path("es-419.pak")
-                self.path("es.pak")
-                self.path("et.pak")
-                self.path("fa.pak")
-                self.path("fi.pak")
-                self.path("fil.pak")
-                self.path("fr.pak")
-                self.path("gu.pak")
-                self.path("he.pak")
-                self.path("hi.pak")
-                self.path("hr.pak")
-                self.path("hu.pak")
-                self.path("id.pak")
-                self.path("it.pak")
-                self.path("ja.pak")
-                self.path("kn.pak")
-                self.path("ko.pak")
-                self.path("lt.pak")
-                self.path("lv.pak")
-                self.path("ml.pak")
-                self.path("mr.pak")
-                self.path("ms.pak")
-                self.path("nb.pak")
-                self.path("nl.pak")
-                self.path("pl.pak")
-                self.path("pt-BR.pak")
-                self.path("pt-PT.pak")
-                self.path("ro.pak")
-                self.path("ru.pak")
-                self.path("sk.pak")
-                self.path("sl.pak")
-                self.path("sr.pak")
-                self.path("sv.pak")
-                self.path("sw.pak")
-                self.path("ta.pak")
-                self.path("te.pak")
-                self.path("th.pak")
-                self.path("tr.pak")
-                self.path("uk.pak")
-                self.path("vi.pak")
-                self.path("zh-CN.pak")
-                self.path("zh-TW.pak")
-
-            with self.prefix(src=os.path.join(pkgdir, 'bin', 'release')):
-                self.path("libvlc.dll")
-                self.path("libvlccore.dll")
-                self.path("plugins/")
+                # For textures
+                path_if_present("openjp2.dll")
+
+                # These need to be installed as a SxS assembly, currently a 'private' assembly.
+                # See http://msdn.microsoft.com/en-us/library/ms235291(VS.80).aspx
+                for libfile in MSVC_RUNTIME_DLLS:
+                    self.path(libfile)
+                for pattern in MSVC_RUNTIME_OPTIONAL_GLOBS:
+                    path_if_present(pattern)
+
+                # SLVoice executable
+                with self.prefix(src=os.path.join(pkgdir, 'bin', 'release')):
+                    self.path("SLVoice.exe")
+
+                # Vivox libraries
+                self.path("vivoxsdk_x64.dll")
+                self.path("ortp_x64.dll")
+
+                # BugSplat
+                if self.args.get('bugsplat'):
+                    self.path("BsSndRpt64.exe")
+                    self.path("BugSplat64.dll")
+                    self.path("BugSplatRc64.dll")
+
+                if self.args['tracy'] == 'ON':
+                    with self.prefix(src=os.path.join(pkgdir, 'bin')):
+                        self.path("tracy-profiler.exe")
+
+                # Growl
+                self.path("growl.dll")
+                self.path("growl++.dll")
+
+                # <FS:ND> Copy symbols for breakpad
+                #self.path("ssleay32.pdb")
+                #self.path("libeay32.pdb")
+                #self.path("growl.pdb")
+                #self.path("growl++.pdb")
+                #self.path('apr-1.pdb', 'libarp.pdb')
+                #self.path('aprutil-1.pdb', 'libaprutil.pdb')
+                # </FS:ND>
+
+            self.path(src="licenses-win32.txt", dst="licenses.txt")
+            self.path("featuretable.txt")
+            self.path("cube.dae")
+
+            with self.prefix(src=pkgdir):
+                self.path("ca-bundle.crt")
+            self.path("VivoxAUP.txt")
+
+            # Media plugins - CEF
+            with self.prefix(dst="llplugin"):
+                with self.prefix(src=os.path.join(self.args['build'], os.pardir, 'media_plugins')):
+                    with self.prefix(src=os.path.join('cef', configuration)):
+                        self.path("media_plugin_cef.dll")
+
+                    # Media plugins - LibVLC
+                    with self.prefix(src=os.path.join('libvlc', configuration)):
+                        self.path("media_plugin_libvlc.dll")
+
+                    # Media plugins - Example (useful for debugging - not shipped with release viewer)
+                    # <FS:Ansariel> Don't package example plugin
+                    #if self.channel_type() != 'release':
+                    #    with self.prefix(src=os.path.join('example', self.args['configuration'])):
+                    #        self.path("media_plugin_example.dll")
+
+                # CEF runtime files - debug
+                # CEF runtime files - not debug (release, relwithdebinfo etc.)
+                config = 'debug' if configuration.lower() == 'debug' else 'release'
+                with self.prefix(src=os.path.join(pkgdir, 'bin', config)):
+                    self.path("chrome_elf.dll")
+                    self.path("d3dcompiler_47.dll")
+                    self.path("libcef.dll")
+                    self.path("libEGL.dll")
+                    self.path("libGLESv2.dll")
+                    self.path("dullahan_host.exe")
+                    self.path("snapshot_blob.bin")
+                    self.path("v8_context_snapshot.bin")
+
+                # MSVC DLLs needed for CEF and have to be in same directory as plugin
+                with self.prefix(src=sharedlibs_dir):
+                    for libfile in MSVC_RUNTIME_DLLS:
+                        self.path(libfile)
+                    self.path_optional("vcruntime140_*.dll")
+
+                # CEF files common to all configurations
+                with self.prefix(src=os.path.join(pkgdir, 'resources')):
+                    self.path("chrome_100_percent.pak")
+                    self.path("chrome_200_percent.pak")
+                    self.path("resources.pak")
+                    self.path("icudtl.dat")
+
+                self.paths((locale + ".pak" for locale in CEF_LOCALE_PAKS),
+                           src=os.path.join(pkgdir, 'resources', 'locales'),
+                           dst='locales')
+
+                with self.prefix(src=os.path.join(pkgdir, 'bin', 'release')):
+                    self.path("libvlc.dll")
+                    self.path("libvlccore.dll")
+                    self.path("plugins/")
 
         if not self.is_packaging_viewer():
             self.package_file = "copied_deps"
@@ -901,63 +1146,62 @@ class Windows_x86_64_Manifest(ViewerManifest):
 
         #return '\n'.join(result)
 
-        def wpath(path):
-            if path.endswith('/') or path.endswith(os.path.sep):
-                path = path[:-1]
-            path = path.replace('/', '\\')
-            return path
-
-        result = ""
-        dest_files = [pair[1] for pair in self.file_list if pair[0] and os.path.isfile(pair[1]) and not pair[1].endswith(".pdb") ] #<FS:ND/> Don't include pdb files.
-        # sort deepest hierarchy first
-        dest_files.sort(key=lambda f: (f.count(os.path.sep), f), reverse=True)
+        def wpath(path, _trans=str.maketrans('/', '\\')):
+            # str.translate with a one-codepoint map is a single C pass,
+            # cheaper than replace()'s substring search; rstrip covers the
+            # old "drop one trailing separator" check
+            return path.rstrip('/\\').translate(_trans)
+
+        # bind the hot names once; the loops below run per packaged file
+        sep = os.path.sep
+        normpath = os.path.normpath
+        file_list = self.file_list
+        # normalized to match the normalized dst entries in file_list
+        dst_prefix = normpath(self.get_dst_prefix()) + sep
+
+        # This is a generator: package_finish() streams the yielded lines
+        # straight into the NSI output, so the (potentially hundreds of KB)
+        # command block never exists as one Python string.
+        # the cheap .pdb suffix check runs before the stat so excluded files
+        # never hit the filesystem; sort deepest hierarchy first. The depth
+        # is decorated onto each entry so the sort compares plain tuples in
+        # C instead of calling a key lambda per element.
+        decorated = [(pair[1].count(sep), pair[1]) for pair in file_list
+                     if pair[0] and not pair[1].endswith(".pdb") #<FS:ND/> Don't include pdb files.
+                     and self._isfile(pair[1])]
+        decorated.sort(reverse=True)
+        dest_files = [pkg_file for depth, pkg_file in decorated]
         out_path = None
+        # file_list dst entries are normalized at insertion (process_file,
+        # put_in_file and friends), so no per-file normpath is needed here
         for pkg_file in dest_files:
-            rel_file = os.path.normpath(pkg_file.replace(self.get_dst_prefix()+os.path.sep,''))
+            rel_file = pkg_file.replace(dst_prefix,'')
             installed_dir = wpath(os.path.join('$INSTDIR', os.path.dirname(rel_file)))
-            pkg_file = wpath(os.path.normpath(pkg_file))
+            pkg_file = wpath(pkg_file)
             if installed_dir != out_path:
                 if install:
                     out_path = installed_dir
-                    result += 'SetOutPath ' + out_path + '\n'
+                    yield 'SetOutPath ' + out_path
             if install:
-                result += 'File ' + pkg_file + '\n'
+                yield 'File ' + pkg_file
             else:
-                result += 'Delete ' + wpath(os.path.join('$INSTDIR', rel_file)) + '\n'
+                yield 'Delete ' + wpath(os.path.join('$INSTDIR', rel_file))
 
         # at the end of a delete, just rmdir all the directories
         if not install:
-            deleted_file_dirs = [os.path.dirname(pair[1].replace(self.get_dst_prefix()+os.path.sep,'')) for pair in self.file_list]
+            deleted_file_dirs = [os.path.dirname(pair[1].replace(dst_prefix,'')) for pair in file_list]
             # find all ancestors so that we don't skip any dirs that happened to have no non-dir children
-            deleted_dirs = []
+            deleted_dirs = set()
             for d in deleted_file_dirs:
-                deleted_dirs.extend(path_ancestors(d))
-            # sort deepest hierarchy first
-            deleted_dirs.sort(key=lambda f: (f.count(os.path.sep), f), reverse=True)
-            prev = None
-            for d in deleted_dirs:
-                if d != prev:   # skip duplicates
-                    result += 'RMDir ' + wpath(os.path.join('$INSTDIR', os.path.normpath(d))) + '\n'
-                prev = d
-
-        return result
+                deleted_dirs.update(path_ancestors(d))
+            # sort deepest hierarchy first (decorated, as above)
+            for depth, d in sorted(((d.count(sep), d) for d in deleted_dirs),
+                                   reverse=True):
+                yield 'RMDir ' + wpath(os.path.join('$INSTDIR', normpath(d)))
         # </FS:Ansariel>
     def dl_url_from_channel(self):
-        if self.channel_type() == 'release':
-            return 'https://www.firestormviewer.org/choose-your-platform'
-        elif self.channel_type() == 'beta':
-            return 'https://www.firestormviewer.org/early-access-beta-downloads'
-        elif self.channel_type() == 'alpha':
-            return 'https://www.firestormviewer.org/early-access-alpha-downloads'
-        elif self.channel_type() == 'manual':
-            return 'https://www.firestormviewer.org/early-access-manual-downloads'
-        elif self.channel_type() == 'profiling':
-            return 'https://www.firestormviewer.org/profiling-downloads'
-        elif self.channel_type() == 'nightly':
-            return 'https://www.firestormviewer.org/firestorm-nightly-build-downloads'
-        else:
-            return '<NO-URL>'
-        
+        return _DL_URLS.get(self.channel_type(), '<NO-URL>')
+
 
     def package_finish(self):
         # a standard map of strings for replacing in the templates
@@ -1034,7 +1278,9 @@ class Windows_x86_64_Manifest(ViewerManifest):
 
         # the following replaces strings in the nsi template
         # it also does python-style % substitution
-        self.replace_in("installers/windows/installer_template.nsi", tempfile, {
+        # (streamed: the install/delete command generators are written
+        # directly into the output file)
+        self.replace_in_stream("installers/windows/installer_template.nsi", tempfile, {
                 "%%VERSION%%":version_vars,
                 # The template references "%%SOURCE%%\installers\windows\...".
                 # Now that we've copied that directory into the app image
@@ -1048,17 +1294,26 @@ class Windows_x86_64_Manifest(ViewerManifest):
                 "%%DELETE_FILES%%":self.nsi_file_commands(False)})
 
         # <FS:Ansariel> Undo Github-Build stuff
-        # Check two paths, one for Program Files, and one for Program Files (x86).
-        # Yay 64bit windows.
-        nsis_path = "makensis.exe"
-        for program_files in '${programfiles}', '${programfiles(x86)}':
-            for nesis_path in 'NSIS', 'NSIS\\Unicode':
-                possible_path = os.path.expandvars(f"{program_files}\\{nesis_path}\\makensis.exe")
-                if os.path.exists(possible_path):
+        # Prefer whatever makensis.exe is on PATH (one lookup); fall back to
+        # the standard install locations. Check two paths, one for Program
+        # Files, and one for Program Files (x86). Yay 64bit windows.
+        nsis_path = shutil.which('makensis.exe')
+        if nsis_path is None:
+            nsis_path = "makensis.exe"
+            for program_files in '${programfiles}', '${programfiles(x86)}':
+                for nsis_dir in 'NSIS', 'NSIS\\Unicode':
+                    possible_path = os.path.expandvars(f"{program_files}\\{nsis_dir}\\makensis.exe")
+                    try:
+                        os.stat(possible_path)
+                    except OSError:
+                        continue
                     nsis_path = possible_path
                     break
+                else:
+                    continue
+                break
 
-        self.run_command([possible_path, '/V2', self.dst_path_of(tempfile)])
+        self.run_command([nsis_path, '/V2', self.dst_path_of(tempfile)])
 
         self.fs_sign_win_installer(substitution_strings) # <FS:ND/> Sign files, step two. Sign installer.
         self.fs_save_windows_symbols()
@@ -1084,6 +1339,11 @@ class Darwin_x86_64_Manifest(ViewerManifest):
     build_data_json_platform = 'mac'
     address_size = 64
 
+    def __init__(self, args):
+        super(Darwin_x86_64_Manifest, self).__init__(args)
+        # strip children started by strip_binary(background=True)
+        self._pending_strips = []
+
     def finish_build_data_dict(self, build_data_dict):
         build_data_dict.update({'Bundle Id':self.args['bundleid']})
         return build_data_dict
@@ -1092,359 +1352,169 @@ class Darwin_x86_64_Manifest(ViewerManifest):
         # darwin requires full app bundle packaging even for debugging.
         return True
 
-# <FS:Ansariel> construct method VMP trampoline crazy VMP launcher juggling shamelessly replaced with old version
-    # def is_rearranging(self):
-        # # That said, some stuff should still only be performed once.
-        # # Are either of these actions in 'actions'? Is the set intersection
-        # # non-empty?
-        # return bool(set(["package", "unpacked"]).intersection(self.args['actions']))
-
-    # def construct(self):
-        # # copy over the build result (this is a no-op if run within the xcode script)
-        # self.path(os.path.join(self.args['configuration'], self.channel()+".app"), dst="")
-
-        # pkgdir = os.path.join(self.args['build'], os.pardir, 'packages')
-        # relpkgdir = os.path.join(pkgdir, "lib", "release")
-        # debpkgdir = os.path.join(pkgdir, "lib", "debug")
-
-        # with self.prefix(src="", dst="Contents"):  # everything goes in Contents
-            # bugsplat_db = self.args.get('bugsplat')
-            # if bugsplat_db:
-                # # Inject BugsplatServerURL into Info.plist if provided.
-                # Info_plist = self.dst_path_of("Info.plist")
-                # Info = plistlib.readPlist(Info_plist)
-                # # https://www.bugsplat.com/docs/platforms/os-x#configuration
-                # Info["BugsplatServerURL"] = \
-                    # "https://{}.bugsplat.com/".format(bugsplat_db)
-                # self.put_in_file(
-                    # plistlib.writePlistToString(Info),
-                    # os.path.basename(Info_plist),
-                    # "Info.plist")
-
-            # # CEF framework goes inside Contents/Frameworks.
-            # # Remember where we parked this car.
-            # with self.prefix(src="", dst="Frameworks"):
-                # CEF_framework = "Chromium Embedded Framework.framework"
-                # self.path2basename(relpkgdir, CEF_framework)
-                # CEF_framework = self.dst_path_of(CEF_framework)
-
-                # if self.args.get('bugsplat'):
-                    # self.path2basename(relpkgdir, "BugsplatMac.framework")
-
-            # with self.prefix(dst="MacOS"):
-                # executable = self.dst_path_of(self.channel())
-                # if self.args.get('bugsplat'):
-                    # # According to Apple Technical Note TN2206:
-                    # # https://developer.apple.com/library/archive/technotes/tn2206/_index.html#//apple_ref/doc/uid/DTS40007919-CH1-TNTAG207
-                    # # "If an app uses @rpath or an absolute path to link to a
-                    # # dynamic library outside of the app, the app will be
-                    # # rejected by Gatekeeper. ... Neither the codesign nor the
-                    # # spctl tool will show the error."
-                    # # (Thanks, Apple. Maybe fix spctl to warn?)
-                    # # The BugsplatMac framework embeds @rpath, which is
-                    # # causing scary Gatekeeper popups at viewer start. Work
-                    # # around this by changing the reference baked into our
-                    # # viewer. The install_name_tool -change option needs the
-                    # # previous value. Instead of guessing -- which might
-                    # # silently be defeated by a BugSplat SDK update that
-                    # # changes their baked-in @rpath -- ask for the path
-                    # # stamped into the framework.
-                    # # Let exception, if any, propagate -- if this doesn't
-                    # # work, we need the build to noisily fail!
-                    # oldpath = subprocess.check_output(
-                        # ['objdump', '-macho', '-dylib-id', '-non-verbose',
-                         # os.path.join(relpkgdir, "BugsplatMac.framework", "BugsplatMac")]
-                        # ).splitlines()[-1]  # take the last line of output
-                    # self.run_command(
-                        # ['install_name_tool', '-change', oldpath,
-                         # '@executable_path/../Frameworks/BugsplatMac.framework/BugsplatMac',
-                         # executable])
-
-                # # NOTE: the -S argument to strip causes it to keep
-                # # enough info for annotated backtraces (i.e. function
-                # # names in the crash log). 'strip' with no arguments
-                # # yields a slightly smaller binary but makes crash
-                # # logs mostly useless. This may be desirable for the
-                # # final release. Or not.
-                # if ("package" in self.args['actions'] or 
-                    # "unpacked" in self.args['actions']):
-                    # self.run_command(
-                        # ['strip', '-S', executable])
-
-            # with self.prefix(dst="Resources"):
-                # # defer cross-platform file copies until we're in the
-                # # nested Resources directory
-                # super(DarwinManifest, self).construct()
-
-                # # need .icns file referenced by Info.plist
-                # with self.prefix(src=self.icon_path(), dst="") :
-                    # self.path("secondlife.icns")
-
-                # # Copy in the updater script and helper modules
-                # self.path(src=os.path.join(pkgdir, 'VMP'), dst="updater")
-
-                # with self.prefix(src="", dst=os.path.join("updater", "icons")):
-                    # self.path2basename(self.icon_path(), "secondlife.ico")
-                    # with self.prefix(src="vmp_icons", dst=""):
-                        # self.path("*.png")
-                        # self.path("*.gif")
-
-                # with self.prefix(src=relpkgdir, dst=""):
-                    # self.path("libndofdev.dylib")
-
-                # with self.prefix(src_dst="cursors_mac"):
-                    # self.path("*.tif")
-
-                # self.path("licenses-mac.txt", dst="licenses.txt")
-                # self.path("featuretable_mac.txt")
-                # self.path("SecondLife.nib")
-
-                # with self.prefix(src=pkgdir,dst=""):
-                    # self.path("ca-bundle.crt")
-
-                # # Translations
-                # self.path("English.lproj/language.txt")
-                # self.replace_in(src="English.lproj/InfoPlist.strings",
-                                # dst="English.lproj/InfoPlist.strings",
-                                # searchdict={'%%VERSION%%':'.'.join(self.args['version'])}
-                                # )
-                # self.path("German.lproj")
-                # self.path("Japanese.lproj")
-                # self.path("Korean.lproj")
-                # self.path("ca.lproj")    
-                # self.path("da.lproj")
-                # self.path("es.lproj")
-                # self.path("fr.lproj")
-                # self.path("hu.lproj")
-                # self.path("it.lproj")
-                # self.path("nl.lproj")
-                # self.path("pl.lproj")
-                # self.path("pt.lproj")
-                # self.path("ru.lproj")
-                # self.path("tr.lproj")
-                # self.path("uk.lproj")
-                # self.path("zh-Hans.lproj")
-
-                # def path_optional(src, dst):
-                    # """
-                    # For a number of our self.path() calls, not only do we want
-                    # to deal with the absence of src, we also want to remember
-                    # which were present. Return either an empty list (absent)
-                    # or a list containing dst (present). Concatenate these
-                    # return values to get a list of all libs that are present.
-                    # """
-                    # # This was simple before we started needing to pass
-                    # # wildcards. Fortunately, self.path() ends up appending a
-                    # # (source, dest) pair to self.file_list for every expanded
-                    # # file processed. Remember its size before the call.
-                    # oldlen = len(self.file_list)
-                    # try:
-                        # self.path(src, dst)
-                        # # The dest appended to self.file_list has been prepended
-                        # # with self.get_dst_prefix(). Strip it off again.
-                        # added = [os.path.relpath(d, self.get_dst_prefix())
-                                 # for s, d in self.file_list[oldlen:]]
-                    # except MissingError as err:
-                        # print >> sys.stderr, "Warning: "+err.msg
-                        # added = []
-                    # if not added:
-                        # print "Skipping %s" % dst
-                    # return added
-
-                # # dylibs is a list of all the .dylib files we expect to need
-                # # in our bundled sub-apps. For each of these we'll create a
-                # # symlink from sub-app/Contents/Resources to the real .dylib.
-                # # Need to get the llcommon dll from any of the build directories as well.
-                # libfile_parent = self.get_dst_prefix()
-                # libfile = "libllcommon.dylib"
-                # dylibs=[]
-                # for libfile in (
-                                # "libapr-1.0.dylib",
-                                # "libaprutil-1.0.dylib",
-                                # "libexpat.1.dylib",
-                                # "libGLOD.dylib",
-                                # # libnghttp2.dylib is a symlink to
-                                # # libnghttp2.major.dylib, which is a symlink to
-                                # # libnghttp2.version.dylib. Get all of them.
-                                # "libnghttp2.*dylib",
-                                # ):
-                    # dylibs += path_optional(os.path.join(relpkgdir, libfile), libfile)
-
-                # # SLVoice executable
-                # with self.prefix(src=os.path.join(pkgdir, 'bin', 'release')):
-                    # self.path("SLVoice")
-
-                # # Vivox libraries
-                # for libfile in (
-                                # 'libortp.dylib',
-                                # 'libvivoxsdk.dylib',
-                                # ):
-                    # self.path2basename(relpkgdir, libfile)
-
-                # # Fmod studio dylibs (vary based on configuration)
-                # if self.args['fmodstudio'] == 'ON':
-                    # if self.args['configuration'].lower() == 'debug':
-                        # for libfile in (
-                                    # "libfmodL.dylib",
-                                    # ):
-                            # dylibs += path_optional(os.path.join(debpkgdir, libfile), libfile)
-                    # else:
-                        # for libfile in (
-                                    # "libfmod.dylib",
-                                    # ):
-                            # dylibs += path_optional(os.path.join(relpkgdir, libfile), libfile)
-
-                # # OpenAL dylibs
-                # if self.args['openal'] == 'ON':
-                    # for libfile in (
-                                # "libopenal.dylib",
-                                # "libalut.dylib",
-                                # ):
-                        # dylibs += path_optional(os.path.join(relpkgdir, libfile), libfile)
-
-                # # our apps
-                # executable_path = {}
-                # embedded_apps = [ (os.path.join("llplugin", "slplugin"), "SLPlugin.app") ]
-                # for app_bld_dir, app in embedded_apps:
-                    # self.path2basename(os.path.join(os.pardir,
-                                                    # app_bld_dir, self.args['configuration']),
-                                       # app)
-                    # executable_path[app] = \
-                        # self.dst_path_of(os.path.join(app, "Contents", "MacOS"))
-
-                    # our apps dependencies on shared libs
-                    # for each app, for each dylib we collected in dylibs,
-                    # create a symlink to the real copy of the dylib.
-                    # with self.prefix(dst=os.path.join(app, "Contents", "Resources")):
-                        # for libfile in dylibs:
-                            # self.relsymlinkf(os.path.join(libfile_parent, libfile))
-
-                # # Dullahan helper apps go inside SLPlugin.app
-                # with self.prefix(dst=os.path.join(
-                    # "SLPlugin.app", "Contents", "Frameworks")):
-
-                    # frameworkname = 'Chromium Embedded Framework'
-
-                    # # This code constructs a relative symlink from the
-                    # # target framework folder back to the real CEF framework.
-                    # # It needs to be relative so that the symlink still works when
-                    # # (as is normal) the user moves the app bundle out of the DMG
-                    # # and into the /Applications folder. Note we pass catch=False,
-                    # # letting the uncaught exception terminate the process, since
-                    # # without this symlink, Second Life web media can't possibly work.
-
-                    # # It might seem simpler just to symlink Frameworks back to
-                    # # the parent of Chromimum Embedded Framework.framework. But
-                    # # that would create a symlink cycle, which breaks our
-                    # # packaging step. So make a symlink from Chromium Embedded
-                    # # Framework.framework to the directory of the same name, which
-                    # # is NOT an ancestor of the symlink.
-
-                    # # from SLPlugin.app/Contents/Frameworks/Chromium Embedded
-                    # # Framework.framework back to
-                    # # $viewer_app/Contents/Frameworks/Chromium Embedded Framework.framework
-                    # SLPlugin_framework = self.relsymlinkf(CEF_framework, catch=False)
-
-
-                    # It might seem simpler just to symlink Frameworks back to
-                    # the parent of Chromimum Embedded Framework.framework. But
-                    # that would create a symlink cycle, which breaks our
-                    # packaging step. So make a symlink from Chromium Embedded
-                    # Framework.framework to the directory of the same name, which
-                    # is NOT an ancestor of the symlink.
+    def ccopyfile(self, src, dst):
+        """For the 'package' action an up-to-date destination is not good
+        enough if it is still a hardlink left by a previous dev run: the
+        base class's stat skip would fire (same inode, identical stats)
+        and strip/codesign would then write through the shared inode into
+        the build or packages tree. Unlink such a dst up front so the skip
+        cannot trigger and ccopyfiledata makes a private copy."""
+        if 'package' in self.actions:
+            try:
+                if os.stat(dst).st_nlink > 1:
+                    os.unlink(dst)
+            except OSError:
+                pass    # destination missing: the base class copies anyway
+        super(Darwin_x86_64_Manifest, self).ccopyfile(src, dst)
+
+    def ccopyfiledata(self, src, dst):
+        """On dev builds the packages tree and the destination bundle live
+        on the same filesystem, so a hardlink is indistinguishable from a
+        copy for packaging purposes at near-zero I/O cost. For the 'package'
+        action we still copy for real: codesigning and in-place binary
+        rewrites need bytes independent of the source tree (ccopyfile
+        above un-shares any leftover hardlinks). Binaries that get
+        restamped are un-shared again before install_name_tool runs
+        (see the dylib_changes drain in construct())."""
+        if 'package' not in self.actions:
+            try:
+                if os.path.lexists(dst):
+                    os.unlink(dst)
+                os.link(src, dst)
+                return
+            except OSError as err:
+                # cross-device, no-hardlink filesystems and link-count
+                # limits all mean "just copy it"
+                if err.errno not in (errno.EXDEV, errno.EPERM,
+                                     errno.EMLINK, errno.ENOTSUP):
+                    raise
+        super(Darwin_x86_64_Manifest, self).ccopyfiledata(src, dst)
+
+    def strip_binary(self, path, background=False):
+        """strip -S the executable at path, unless it is byte-identical to
+        the last binary we stripped there. strip costs a fork plus a full
+        Mach-O rewrite, and in an iterative dev cycle the executable often
+        hasn't changed between packaging runs, so remember the (mtime, size)
+        of each strip result in a small JSON cache next to the build
+        products and skip when it still matches.
+
+        With background=True the strip is started but not waited for, so
+        its Mach-O rewrite overlaps whatever construct() does next; call
+        finish_strips() once nothing else will touch the binary."""
+        cache_path = os.path.join(self.args['build'], '.strip_cache.json')
+        try:
+            with open(cache_path) as cache_file:
+                cache = json.load(cache_file)
+        except (OSError, ValueError):
+            cache = {}
+        st = os.stat(path)
+        if cache.get(path) == [st.st_mtime_ns, st.st_size]:
+            return
+        # strip rewrites its target in place. If ccopyfiledata()
+        # installed this binary as a hardlink into the build or packages
+        # tree (as it does on dev 'unpacked' runs), give it a private
+        # inode first so the rewrite can't reach back into the source.
+        if st.st_nlink > 1:
+            unshared = path + '.unshared'
+            shutil.copy2(path, unshared)
+            os.replace(unshared, path)
+        command = ['strip', '-S', path]
+        print("Running command:", shlex.join(command))
+        sys.stdout.flush()
+        proc = subprocess.Popen(command)
+        self._pending_strips.append((proc, path, cache_path))
+        if not background:
+            self.finish_strips()
+
+    def finish_strips(self):
+        """Wait for any strip_binary(background=True) children and record
+        their results in the strip cache."""
+        pending, self._pending_strips = self._pending_strips, []
+        for proc, path, cache_path in pending:
+            if proc.wait() != 0:
+                raise ManifestError("Command %s returned non-zero status (%s)"
+                                    % (['strip', '-S', path], proc.returncode))
+            try:
+                with open(cache_path) as cache_file:
+                    cache = json.load(cache_file)
+            except (OSError, ValueError):
+                cache = {}
+            st = os.stat(path)
+            cache[path] = [st.st_mtime_ns, st.st_size]
+            try:
+                with open(cache_path, 'w') as cache_file:
+                    json.dump(cache, cache_file)
+            except OSError:
+                pass    # the cache is an optimization, never a requirement
+
+    def _popen_batch(self, commands):
+        """Launch the given argv lists as concurrent children and wait for
+        them all, raising ManifestError on the first nonzero status. For
+        short tool runs (SetFile and friends) process start-up dominates,
+        so overlapping it is the whole win."""
+        procs = []
+        for command in commands:
+            print("Running command:", shlex.join(command))
+            procs.append(subprocess.Popen(command))
+        for proc in procs:
+            if proc.wait() != 0:
+                raise ManifestError("Command %s returned non-zero status (%s)"
+                                    % (proc.args, proc.returncode))
+
+    def _find_dylibs(self, roots):
+        """Collect the *.dylib files directly under each directory in roots,
+        in one os.scandir() pass per directory instead of a glob (which
+        re-reads the directory and fnmatches every entry). Missing
+        directories are skipped, matching glob's empty result."""
+        found = []
+        for root in roots:
+            try:
+                entries = os.scandir(root)
+            except OSError:
+                continue
+            with entries:
+                found.extend(entry.path for entry in entries
+                             if entry.name.endswith('.dylib'))
+        return found
+
+    def get_dylib_id(self, path):
+        """Return the install name (LC_ID_DYLIB) stamped into the dylib at
+        path, read in-process by read_dylib_id(). The result is memoized in
+        a small JSON cache next to the build products, keyed on the file's
+        (mtime, size): prebuilt frameworks rarely change between packaging
+        runs, so repeat runs skip even the small Mach-O read."""
+        st = os.stat(path)
+        key = '%s:%d:%d' % (path, st.st_mtime_ns, st.st_size)
+        cache_path = os.path.join(self.args['build'],
+                                  '.viewer_manifest_cache.json')
+        try:
+            with open(cache_path) as cache_file:
+                cache = json.load(cache_file)
+        except (OSError, ValueError):
+            cache = {}
+        dylib_id = cache.get(key)
+        if dylib_id is None:
+            dylib_id = read_dylib_id(path)
+            cache[key] = dylib_id
+            try:
+                with open(cache_path, 'w') as cache_file:
+                    json.dump(cache, cache_file)
+            except OSError:
+                pass    # the cache is an optimization, never a requirement
+        return dylib_id
 
-                    # from SLPlugin.app/Contents/Frameworks/Chromium Embedded
-                    # Framework.framework back to
-                    # $viewer_app/Contents/Frameworks/Chromium Embedded Framework.framework
-                    # SLPlugin_framework = self.relsymlinkf(CEF_framework, catch=False)
-
-                    # # for all the multiple CEF/Dullahan (as of CEF 76) helper app bundles we need:
-                    # for helper in (
-                        # "DullahanHelper",
-                        # "DullahanHelper (GPU)",
-                        # "DullahanHelper (Renderer)",
-                        # "DullahanHelper (Plugin)",
-                    # ):
-                        # # app is the directory name of the app bundle, with app/Contents/MacOS/helper as the executable
-                        # app = helper + ".app"
-
-                        # # copy DullahanHelper.app
-                        # self.path2basename(relpkgdir, app)
-
-                        # # and fix that up with a Frameworks/CEF symlink too
-                        # with self.prefix(dst=os.path.join(
-                                # app, 'Contents', 'Frameworks')):
-                            # # from Dullahan Helper *.app/Contents/Frameworks/Chromium Embedded
-                            # # Framework.framework back to
-                            # # SLPlugin.app/Contents/Frameworks/Chromium Embedded Framework.framework
-                            # # Since SLPlugin_framework is itself a
-                            # # symlink, don't let relsymlinkf() resolve --
-                            # # explicitly call relpath(symlink=True) and
-                            # # create that symlink here.
-                            # helper_framework = \
-                            # self.symlinkf(self.relpath(SLPlugin_framework, symlink=True), catch=False)
-
-                        # # change_command includes install_name_tool, the
-                        # # -change subcommand and the old framework rpath
-                        # # stamped into the executable. To use it with
-                        # # run_command(), we must still append the new
-                        # # framework path and the pathname of the
-                        # # executable to change.
-                        # change_command = [
-                            # 'install_name_tool', '-change',
-                            # '@rpath/Frameworks/Chromium Embedded Framework.framework/Chromium Embedded Framework']
-
-                        # with self.prefix(dst=os.path.join(
-                                # app, 'Contents', 'MacOS')):
-                            # # Now self.get_dst_prefix() is, at runtime,
-                            # # @executable_path. Locate the helper app
-                            # # framework (which is a symlink) from here.
-                            # newpath = os.path.join(
-                                # '@executable_path',
-                                    # self.relpath(helper_framework, symlink=True),
-                                # frameworkname)
-                                # # and restamp the Dullahan Helper executable itself
-                            # self.run_command(
-                                # change_command +
-                                    # [newpath, self.dst_path_of(helper)])
-
-                # # SLPlugin plugins
-                # with self.prefix(dst="llplugin"):
-                    # dylibexecutable = 'media_plugin_cef.dylib'
-                    # self.path2basename("../media_plugins/cef/" + self.args['configuration'],
-                                       # dylibexecutable)
-
-                    # # Do this install_name_tool *after* media plugin is copied over.
-                    # # Locate the framework lib executable -- relative to
-                    # # SLPlugin.app/Contents/MacOS, which will be our
-                    # # @executable_path at runtime!
-                    # newpath = os.path.join(
-                        # '@executable_path',
-                        # self.relpath(SLPlugin_framework, executable_path["SLPlugin.app"],
-                                     # symlink=True),
-                        # frameworkname)
-                    # # restamp media_plugin_cef.dylib
-                    # self.run_command(
-                        # change_command +
-                        # [newpath, self.dst_path_of(dylibexecutable)])
-
-                    # # copy LibVLC plugin itself
-                    # self.path2basename("../media_plugins/libvlc/" + self.args['configuration'],
-                                       # "media_plugin_libvlc.dylib")
-
-                    # # copy LibVLC dynamic libraries
-                    # with self.prefix(src=relpkgdir, dst="lib"):
-                        # self.path( "libvlc*.dylib*" )
-                        # # copy LibVLC plugins folder
-                        # with self.prefix(src='plugins', dst=""):
-                            # self.path( "*.dylib" )
-                            # self.path( "plugins.dat" )
+# <FS:Ansariel> construct method VMP trampoline crazy VMP launcher juggling shamelessly replaced with old version
 
     def construct(self):
+        # args consulted repeatedly below; bind them once
+        configuration = self.args['configuration']
+        buildtype = self.args['buildtype']
+        actions = self.args['actions']
+
         # copy over the build result (this is a no-op if run within the xcode
         # script)
         #self.path(os.path.join(self.args['configuration'], self.channel() + ".app"), dst="")
-        self.path(os.path.join(self.args['configuration'], "Firestorm.app"), dst="")
+        self.path(os.path.join(configuration, "Firestorm.app"), dst="")
 
         pkgdir = os.path.join(self.args['build'], os.pardir, 'packages')
         relpkgdir = os.path.join(pkgdir, "lib", "release")
@@ -1454,24 +1524,52 @@ class Darwin_x86_64_Manifest(ViewerManifest):
         chardetdir = os.path.join(pkgdir, "lib", "python", "chardet")
         idnadir = os.path.join(pkgdir, "lib", "python", "idna")
 
+        # install_name_tool -change fixups are queued per target binary and
+        # issued as a single invocation each at the end of construct(): the
+        # tool accepts any number of -change pairs, and every invocation
+        # costs a fork/exec plus a full Mach-O load-command rewrite.
+        dylib_changes = {}
+        def change_dylib_reference(target, oldpath, newpath):
+            dylib_changes.setdefault(target, []).append((oldpath, newpath))
+
         with self.prefix(src="", dst="Contents"):  # everything goes in Contents
             with self.prefix(dst="MacOS"):
                 executable = self.dst_path_of("Firestorm") # locate the executable within the bundle.
 
             bugsplat_db = self.args.get('bugsplat')
-            print(f"debug: bugsplat_db={bugsplat_db}")
             if bugsplat_db:
                 # Inject BugsplatServerURL into Info.plist if provided.
+                # https://www.bugsplat.com/docs/platforms/os-x#configuration
                 Info_plist = self.dst_path_of("Info.plist")
+                url = "https://{}.bugsplat.com/".format(bugsplat_db)
                 with open(Info_plist, 'rb') as f:
-                    Info = plistlib.load(f)
-                    # https://www.bugsplat.com/docs/platforms/os-x#configuration
-                    Info["BugsplatServerURL"] = \
-                        "https://{}.bugsplat.com/".format(bugsplat_db)
-                    self.put_in_file(
-                        plistlib.dumps(Info),
-                        os.path.basename(Info_plist),
-                        "Info.plist")
+                    data = f.read()
+                if data.lstrip().startswith(b'<?xml') \
+                   and b'BugsplatServerURL' not in data:
+                    # XML plist without the key yet (the usual case): splice
+                    # the one entry in before the closing </dict> instead of
+                    # round-tripping the whole multi-KB plist through a
+                    # parse + re-serialize.
+                    insertion = ('\t<key>BugsplatServerURL</key>\n'
+                                 '\t<string>%s</string>\n'
+                                 % saxutils.escape(url)).encode()
+                    head, sep, tail = data.rpartition(b'</dict>')
+                    data = head + insertion + sep + tail
+                else:
+                    # binary plist, or the key is already present and must
+                    # be replaced: let plistlib do the full rewrite
+                    Info = plistlib.loads(data)
+                    Info["BugsplatServerURL"] = url
+                    data = plistlib.dumps(Info)
+                # write to a sibling and rename into place: one write pass
+                # and no window where Info.plist sits truncated, instead of
+                # put_in_file()'s open-and-truncate of the live file
+                tmp = Info_plist + '.tmp'
+                with open(tmp, 'wb') as f:
+                    f.write(data)
+                os.replace(tmp, Info_plist)
+                # keep the bookkeeping put_in_file() used to do
+                self.file_list.append(["Info.plist", Info_plist])
 
         with self.prefix(dst="Contents"):  # everything goes in Contents
             # self.path("Info.plist", dst="Info.plist")
@@ -1485,6 +1583,12 @@ class Darwin_x86_64_Manifest(ViewerManifest):
                 CEF_framework = "Chromium Embedded Framework.framework"
                 self.path2basename(relpkgdir, CEF_framework)
                 CEF_framework = self.dst_path_of(CEF_framework)
+                # Resolve the framework path once, now that it exists on
+                # disk, and record it with the pre-resolved tree roots: the
+                # SLPlugin relsymlinkf() and any later relpath() against it
+                # then answer from the dict instead of re-walking the
+                # directory chain.
+                self._real_roots[CEF_framework] = os.path.realpath(CEF_framework)
                 if self.args.get('bugsplat'):
                     self.path2basename(relpkgdir, "BugsplatMac.framework")
 
@@ -1508,15 +1612,11 @@ class Darwin_x86_64_Manifest(ViewerManifest):
                     # stamped into the framework.
                     # Let exception, if any, propagate -- if this doesn't
                     # work, we need the build to noisily fail!
-                    oldpath = subprocess.check_output(
-                        ['objdump', '--macho', '--dylib-id', '--non-verbose',
-                         os.path.join(relpkgdir, "BugsplatMac.framework", "BugsplatMac")],
-                        text=True
-                        ).splitlines()[-1]  # take the last line of output
-                    self.run_command(
-                        ['install_name_tool', '-change', oldpath,
-                         '@executable_path/../Frameworks/BugsplatMac.framework/BugsplatMac',
-                         executable])
+                    oldpath = self.get_dylib_id(
+                        os.path.join(relpkgdir, "BugsplatMac.framework", "BugsplatMac"))
+                    change_dylib_reference(
+                        executable, oldpath,
+                        '@executable_path/../Frameworks/BugsplatMac.framework/BugsplatMac')
 
                 # NOTE: the -S argument to strip causes it to keep
                 # enough info for annotated backtraces (i.e. function
@@ -1524,10 +1624,13 @@ class Darwin_x86_64_Manifest(ViewerManifest):
                 # yields a slightly smaller binary but makes crash
                 # logs mostly useless. This may be desirable for the
                 # final release. Or not.
-                if ("package" in self.args['actions'] or
-                    "unpacked" in self.args['actions']):
-                    self.run_command(
-                        ['strip', '-S', executable])
+                if ("package" in actions or
+                    "unpacked" in actions):
+                    # background: the rewrite overlaps the Resources and
+                    # llplugin copies below, none of which touch the
+                    # executable; finish_strips() joins it before the
+                    # install_name_tool drain restamps the same binary
+                    self.strip_binary(executable, background=True)
 
             # most everything goes in the Resources directory
             with self.prefix(dst="Resources"):
@@ -1580,6 +1683,15 @@ class Darwin_x86_64_Manifest(ViewerManifest):
                     or a list containing dst (present). Concatenate these
                     return values to get a list of all libs that are present.
                     """
+                    # Every absent optional lib would otherwise cost a
+                    # MissingError raise/catch inside path(); our callers all
+                    # pass absolute literal filenames, so one isfile() stat
+                    # settles the miss up front.
+                    if os.path.isabs(src) \
+                       and not self.wildcard_pattern.search(src) \
+                       and not os.path.isfile(src):
+                        print("Skipping %s" % dst)
+                        return []
                     # This was simple before we started needing to pass
                     # wildcards. Fortunately, self.path() ends up appending a
                     # (source, dest) pair to self.file_list for every expanded
@@ -1600,18 +1712,16 @@ class Darwin_x86_64_Manifest(ViewerManifest):
 
                 # WebRTC libraries
                 with self.prefix(src=os.path.join(self.args['build'], os.pardir,
-                                          'sharedlibs', self.args['buildtype'], 'Resources')):
+                                          'sharedlibs', buildtype, 'Resources')):
                     for libfile in (
                             'libllwebrtc.dylib',
                     ):
                         self.path(libfile)
 
                         oldpath = os.path.join("@rpath", libfile)
-                        print(f"debug: oldpath={oldpath} executable={executable} libfile={libfile}")
-                        self.run_command(
-                            ['install_name_tool', '-change', 
-                             oldpath,
-                             '@executable_path/../Resources/%s' % libfile, executable])
+                        change_dylib_reference(
+                            executable, oldpath,
+                            '@executable_path/../Resources/%s' % libfile)
 
                 # dylibs is a list of all the .dylib files we expect to need
                 # in our bundled sub-apps. For each of these we'll create a
@@ -1641,58 +1751,57 @@ class Darwin_x86_64_Manifest(ViewerManifest):
                 # Fmod studio dylibs (vary based on configuration)
                 # <FS:Beq> Fix intolerant processing of booleans
                 # if self.args['fmodstudio'].lower() == 'ON':
-                usefmod = self.args['fmodstudio'].lower()
-                print(f"debug: fmodstudio={usefmod}")
-                if usefmod == 'on':
-                    if self.args['buildtype'].lower() == 'debug':
-                        print("debug: fmodstudio is used in debug")
+                if self.args['fmodstudio'].lower() == 'on':
+                    if buildtype.lower() == 'debug':
                         for libfile in (
                                     "libfmodL.dylib",
                                     ):
                             dylibs += path_optional(os.path.join(debpkgdir, libfile), libfile)
                     else:
-                        print("debug: fmodstudio is used in release")
                         for libfile in (
                                     "libfmod.dylib",
                                     ):
-                            print("debug: adding {} to dylibs for fmodstudio".format(path_optional(os.path.join(relpkgdir, libfile), libfile)))
                             dylibs += path_optional(os.path.join(relpkgdir, libfile), libfile)
 
                 # OpenAL dylibs
-                useopenal = self.args['openal'].lower()
-                print(f"debug: openal={useopenal}")
-                if useopenal == 'on':
+                if self.args['openal'].lower() == 'on':
                     for libfile in (
                                 "libopenal.dylib",
                                 "libalut.dylib",
                                 ):
-                        print("debug: adding {} to dylibs for openal".format(path_optional(os.path.join(relpkgdir, libfile), libfile)))
                         dylibs += path_optional(os.path.join(relpkgdir, libfile), libfile)
 
                         oldpath = os.path.join("@rpath", libfile)
-                        self.run_command(
-                            ['install_name_tool', '-change', oldpath,
-                             '@executable_path/../Resources/%s' % libfile,
-                             executable])
-
-                print(f"debug: dylibs = {dylibs}")
+                        change_dylib_reference(
+                            executable, oldpath,
+                            '@executable_path/../Resources/%s' % libfile)
 
                 # our apps
                 executable_path = {}
                 embedded_apps = [ (os.path.join("llplugin", "slplugin"), "SLPlugin.app") ]
-                for app_bld_dir, app in embedded_apps:
-                    self.path2basename(os.path.join(os.pardir,
-                                                    app_bld_dir, self.args['configuration']),
-                                       app)
-                    executable_path[app] = \
-                        self.dst_path_of(os.path.join(app, "Contents", "MacOS"))
-
-                    # our apps dependencies on shared libs
-                    # for each app, for each dylib we collected in dylibs,
-                    # create a symlink to the real copy of the dylib.
-                    with self.prefix(dst=os.path.join(app, "Contents", "Resources")):
-                        for libfile in dylibs:
-                            self.relsymlinkf(os.path.join(libfile_parent, libfile))
+                # the dylib sources don't depend on the app, so join them
+                # once rather than per (app x dylib) pair
+                abs_dylib_srcs = [os.path.join(libfile_parent, libfile)
+                                  for libfile in dylibs]
+                # One deferred batch for all the embedded app bundles:
+                # their many small file copies drain on a thread pool
+                # when the block exits. The symlinks are created inline
+                # (they carry no file data) and nothing in the loop reads
+                # the copied files back.
+                with self.deferred_copy_batch():
+                    for app_bld_dir, app in embedded_apps:
+                        self.path2basename(os.path.join(os.pardir,
+                                                        app_bld_dir, configuration),
+                                           app)
+                        executable_path[app] = \
+                            self.dst_path_of(os.path.join(app, "Contents", "MacOS"))
+
+                        # our apps dependencies on shared libs
+                        # for each app, for each dylib we collected in dylibs,
+                        # create a symlink to the real copy of the dylib.
+                        with self.prefix(dst=os.path.join(app, "Contents", "Resources")):
+                            for libsrc in abs_dylib_srcs:
+                                self.relsymlinkf(libsrc)
 
                 # Dullahan helper apps go inside SLPlugin.app
                 with self.prefix(dst=os.path.join(
@@ -1721,94 +1830,149 @@ class Darwin_x86_64_Manifest(ViewerManifest):
                     SLPlugin_framework = self.relsymlinkf(CEF_framework, catch=False)
 
                     # for all the multiple CEF/Dullahan (as of CEF 76) helper app bundles we need:
-                    for helper in (
-                        "DullahanHelper",
-                        "DullahanHelper (GPU)",
-                        "DullahanHelper (Renderer)",
-                        "DullahanHelper (Plugin)",
-                    ):
-                        # app is the directory name of the app bundle, with app/Contents/MacOS/helper as the executable
-                        app = helper + ".app"
-
-                        # copy DullahanHelper.app
-                        self.path2basename(relpkgdir, app)
-
-                        # and fix that up with a Frameworks/CEF symlink too
-                        with self.prefix(dst=os.path.join(
-                                app, 'Contents', 'Frameworks')):
-                            # from Dullahan Helper *.app/Contents/Frameworks/Chromium Embedded
-                            # Framework.framework back to
-                            # SLPlugin.app/Contents/Frameworks/Chromium Embedded Framework.framework
-                            # Since SLPlugin_framework is itself a
-                            # symlink, don't let relsymlinkf() resolve --
-                            # explicitly call relpath(symlink=True) and
-                            # create that symlink here.
-                            helper_framework = \
-                            self.symlinkf(self.relpath(SLPlugin_framework, symlink=True), catch=False)
-
-                        # change_command includes install_name_tool, the
-                        # -change subcommand and the old framework rpath
-                        # stamped into the executable. To use it with
-                        # run_command(), we must still append the new
-                        # framework path and the pathname of the
-                        # executable to change.
-                        change_command = [
-                            'install_name_tool', '-change',
-                            '@rpath/Frameworks/Chromium Embedded Framework.framework/Chromium Embedded Framework']
-
-                        with self.prefix(dst=os.path.join(
-                                app, 'Contents', 'MacOS')):
-                            # Now self.get_dst_prefix() is, at runtime,
-                            # @executable_path. Locate the helper app
-                            # framework (which is a symlink) from here.
-                            newpath = os.path.join(
-                                '@executable_path',
-                                    self.relpath(helper_framework, symlink=True),
-                                frameworkname)
-                                # and restamp the Dullahan Helper executable itself
-                            self.run_command(
-                                change_command +
-                                    [newpath, self.dst_path_of(helper)])
+                    # One deferred batch for all four bundles, so their file
+                    # copies drain on a single thread pool instead of bundle
+                    # by bundle. Everything else in the loop body is either
+                    # string work (relpath over textual paths), symlinks
+                    # (whose parent dirs symlinkf() creates itself) or a
+                    # queued install_name_tool fixup, none of which depend
+                    # on the copied file data being present yet.
+                    # Every helper bundle sits at the same depth inside
+                    # SLPlugin.app/Contents/Frameworks, so the two relative
+                    # paths the loop needs are loop-invariant: compute them
+                    # once instead of re-running relpath() and the symlinkf
+                    # dst-prefix plumbing per helper.
+                    fw_dirname = os.path.basename(SLPlugin_framework)
+                    # from Dullahan Helper *.app/Contents/Frameworks/Chromium
+                    # Embedded Framework.framework back to
+                    # SLPlugin.app/Contents/Frameworks/Chromium Embedded
+                    # Framework.framework. Since SLPlugin_framework is itself
+                    # a symlink, this is a plain textual relpath -- no
+                    # resolving.
+                    helper_framework_src = os.path.join(
+                        os.pardir, os.pardir, os.pardir, fw_dirname)
+                    # At runtime the helper's Contents/MacOS directory is
+                    # @executable_path; the helper app framework (which is a
+                    # symlink) is reached from there via ../Frameworks.
+                    newpath = os.path.join(
+                        '@executable_path', os.pardir, 'Frameworks',
+                        fw_dirname, frameworkname)
+
+                    with self.deferred_copy_batch():
+                        for helper in (
+                            "DullahanHelper",
+                            "DullahanHelper (GPU)",
+                            "DullahanHelper (Renderer)",
+                            "DullahanHelper (Plugin)",
+                        ):
+                            # app is the directory name of the app bundle, with app/Contents/MacOS/helper as the executable
+                            app = helper + ".app"
+
+                            # copy DullahanHelper.app
+                            self.path2basename(relpkgdir, app)
+
+                            # and fix that up with a Frameworks/CEF symlink too
+                            helper_frameworks = self.dst_path_of(
+                                os.path.join(app, 'Contents', 'Frameworks'))
+                            self.cmakedirs(helper_frameworks)
+                            self._symlinkf(
+                                helper_framework_src,
+                                os.path.join(helper_frameworks, fw_dirname),
+                                False)  # catch=False: web media needs this
+
+                            # and queue the restamp of the Dullahan Helper
+                            # executable itself
+                            change_dylib_reference(
+                                self.dst_path_of(os.path.join(
+                                    app, 'Contents', 'MacOS', helper)),
+                                '@rpath/Frameworks/Chromium Embedded Framework.framework/Chromium Embedded Framework',
+                                newpath)
 
                 # SLPlugin plugins
                 with self.prefix(dst="llplugin"):
                     dylibexecutable = 'media_plugin_cef.dylib'
-                    self.path2basename("../media_plugins/cef/" + self.args['configuration'],
+                    self.path2basename("../media_plugins/cef/" + configuration,
                                        dylibexecutable)
 
                     # copy LibVLC plugin itself
                     dylibexecutable = 'media_plugin_libvlc.dylib'
-                    self.path2basename("../media_plugins/libvlc/" + self.args['configuration'], dylibexecutable)
+                    self.path2basename("../media_plugins/libvlc/" + configuration, dylibexecutable)
                     # add @rpath for the correct LibVLC subfolder
                     self.run_command(['install_name_tool', '-add_rpath', '@loader_path/lib', self.dst_path_of(dylibexecutable)])
 
-                    # copy LibVLC dynamic libraries
-                    with self.prefix(src=os.path.join(self.args['build'], os.pardir, 'packages', 'lib', 'release' ), dst="lib"):
-                        self.path( "libvlc*.dylib*" )
-
-                    # copy LibVLC plugins folder
-                    with self.prefix(src=os.path.join(self.args['build'], os.pardir, 'packages', 'lib', 'release', 'plugins' ), dst="lib"):
-                        self.path("*.dylib")
-                        self.path("plugins.dat")
-
-                # do this install_name_tool *after* media plugin is copied over
+                    # copy LibVLC dynamic libraries and its plugins folder.
+                    # The plugins folder holds a few hundred dylibs, and
+                    # path()'s glob would re-list the directory per pattern
+                    # and stat every candidate name; scan each directory
+                    # once instead and feed matching entries straight to
+                    # process_file() (the dirent already tells us the entry
+                    # type, so no per-name stat either).
+                    # (relpkgdir, computed once at construct() entry, is the
+                    # packages/lib/release path these used to re-join.)
+                    def scan_path(srcdir, match, dst="lib"):
+                        count = 0
+                        with self.prefix(dst=dst):
+                            with os.scandir(srcdir) as entries:
+                                for entry in entries:
+                                    if match(entry.name) and not entry.is_dir():
+                                        count += self.process_file(
+                                            entry.path,
+                                            self.dst_path_of(entry.name))
+                        if not count:
+                            self.missing.append(MissingFile(pattern=match.__doc__,
+                                                            tried=[srcdir]))
+                        return count
+
+                    def match_libvlc(name):
+                        """libvlc*.dylib*"""
+                        return name.startswith('libvlc') and '.dylib' in name
+                    scan_path(relpkgdir, match_libvlc)
+
+                    def match_plugin(name):
+                        """*.dylib or plugins.dat"""
+                        return name.endswith('.dylib') or name == 'plugins.dat'
+                    scan_path(os.path.join(relpkgdir, 'plugins'), match_plugin)
+
+                # this restamp happens *after* media plugin is copied over,
+                # since the queue is drained at the end of construct()
                 dylibexecutablepath = self.dst_path_of('llplugin/media_plugin_cef.dylib')
-                self.run_command_shell('install_name_tool -change '
-                                 '"@rpath/Frameworks/Chromium Embedded Framework.framework/Chromium Embedded Framework" '
-                                 '"@executable_path/../Frameworks/Chromium Embedded Framework.framework/Chromium Embedded Framework" "%s"' % dylibexecutablepath)
+                change_dylib_reference(
+                    dylibexecutablepath,
+                    '@rpath/Frameworks/Chromium Embedded Framework.framework/Chromium Embedded Framework',
+                    '@executable_path/../Frameworks/Chromium Embedded Framework.framework/Chromium Embedded Framework')
+
+        # join the background strip before restamping: install_name_tool
+        # rewrites the same executable in place
+        self.finish_strips()
+
+        # drain the queued reference fixups: one install_name_tool
+        # invocation per binary, all of its -change pairs folded in
+        for target, pairs in dylib_changes.items():
+            # install_name_tool rewrites its target in place. If
+            # ccopyfiledata() installed this binary as a hardlink into the
+            # packages tree, give it a private inode first so the restamp
+            # can't reach back into the source.
+            if os.stat(target).st_nlink > 1:
+                unshared = target + '.unshared'
+                shutil.copy2(target, unshared)
+                os.replace(unshared, target)
+            command = ['install_name_tool']
+            for oldpath, newpath in pairs:
+                command += ['-change', oldpath, newpath]
+            command.append(target)
+            self.run_command(command)
 
         # NOTE: the -S argument to strip causes it to keep enough info for
         # annotated backtraces (i.e. function names in the crash log).  'strip' with no
         # arguments yields a slightly smaller binary but makes crash logs mostly useless.
         # This may be desirable for the final release.  Or not.
-        if ("package" in self.args['actions'] or 
-            "unpacked" in self.args['actions']):
-            self.run_command_shell('strip -S %(viewer_binary)r' %
-                            { 'viewer_binary' : self.dst_path_of('Contents/MacOS/Firestorm')})
+        if ("package" in actions or
+            "unpacked" in actions):
+            # argv form: no /bin/sh fork and no quoting pass over the path
+            self.strip_binary(self.dst_path_of('Contents/MacOS/Firestorm'))
 # </FS:Ansariel> construct method VMP trampoline crazy VMP launcher juggling shamelessly replaced with old version
 
     def package_finish(self):
-        global CHANNEL_VENDOR_BASE
         # MBW -- If the mounted volume name changes, it breaks the .DS_Store's background image and icon positioning.
         #  If we really need differently named volumes, we'll need to create multiple DS_Store file images, or use some other trick.
 
@@ -1824,14 +1988,249 @@ class Darwin_x86_64_Manifest(ViewerManifest):
         # make sure we don't have stale files laying about
         self.remove(sparsename, finalname)
 
+        app_name = self.app_name()
+
+        # Stage the image contents in a plain directory and build the
+        # image from it with -srcfolder, instead of pre-allocating an
+        # empty sparse image and copying the whole bundle file by file
+        # into the mounted volume. The app is hardlinked into the
+        # staging tree where the filesystem allows, so the only full
+        # pass over the payload bytes is hdiutil's own.
+        stagingdir = imagename + ".stage"
+        if os.path.exists(stagingdir):
+            shutil.rmtree(stagingdir)
+        app_in_stage = os.path.join(stagingdir, app_name + ".app")
+
+        shutil.copytree(self.get_dst_prefix(), app_in_stage,
+                        symlinks=True, copy_function=_link_or_copy)
+
+        # Sign the app if requested; sign the staged copy, before the
+        # image is built from it: hdiutil preserves the extended
+        # attributes the signature lives in when it copies, where moving
+        # the files with python would leave them behind and invalidate
+        # the signatures.
+        notarize_proc = None
+        notarize_after_create = False
+        if 'signature' in self.args:
+            print("Attempting to sign '%s'" % app_in_stage)
+            identity = self.args['signature']
+            if identity == '':
+                identity = 'Developer ID Application'
+
+            def start_notarize():
+                # Notarization is network-bound (upload plus Apple's
+                # scan): start it in the background and collect it while
+                # the volume is still mounted below. It must not launch
+                # until hdiutil create has imaged the staging directory,
+                # though -- apple-notarize.sh ditto-zips the app right
+                # next to it inside the staging tree, and that transient
+                # zip must not be captured in the DMG (or blow the
+                # sparse image's size budget).
+                command = [
+                    self.src_path_of("installers/darwin/apple-notarize.sh"),
+                    app_in_stage]
+                print("Running command:", shlex.join(command))
+                return subprocess.Popen(command)
+
+            # Optional fast path: rcodesign hashes Mach-O pages on all
+            # cores where Apple's codesign is single-threaded, and signs
+            # nested code in one pass. It can't use the login keychain,
+            # so it only engages when the cert has been exported for it;
+            # configure with environment variables like the Windows
+            # signtool path. Notarization below is unaffected.
+            rcodesign = shutil.which('rcodesign')
+            rcodesign_p12 = os.getenv('RCODESIGN_P12_PATH')
+            if rcodesign and rcodesign_p12:
+                command = [rcodesign, 'sign',
+                           '--code-signature-flags', 'runtime',
+                           '--entitlements-xml-path',
+                           self.src_path_of("slplugin.entitlements"),
+                           '--p12-file', rcodesign_p12]
+                p12_pwd_file = os.getenv('RCODESIGN_P12_PASSWORD_FILE')
+                if p12_pwd_file:
+                    command += ['--p12-password-file', p12_pwd_file]
+                self.run_command(command + [app_in_stage])
+                notarize_after_create = True
+                build_secrets_checkout = None
+            else:
+                build_secrets_checkout = os.environ.get('build_secrets_checkout')
+            # Look for an environment variable set via build.sh when running in Team City.
+            if build_secrets_checkout is not None:
+                # variable found so use it to unlock keychain followed by codesign
+                home_path = os.environ['HOME']
+                keychain_pwd_path = os.path.join(build_secrets_checkout,'code-signing-osx','password.txt')
+                keychain_pwd = open(keychain_pwd_path).read().rstrip()
+
+                # Note: As of macOS Sierra, keychains are created with
+                #       names postfixed with '-db' so for example, the SL
+                #       Viewer keychain would by default be found in
+                #       ~/Library/Keychains/viewer.keychain-db instead of
+                #       just ~/Library/Keychains/viewer.keychain in
+                #       earlier versions.
+                #
+                #       Because we have old OS files from previous
+                #       versions of macOS on the build hosts, the
+                #       configurations are different on each host. Some
+                #       have viewer.keychain, some have viewer.keychain-db
+                #       and some have both. As you can see in the line
+                #       below, this script expects the Linden Developer
+                #       cert/keys to be in viewer.keychain.
+                #
+                #       To correctly sign builds you need to make sure
+                #       ~/Library/Keychains/viewer.keychain exists on the
+                #       host and that it contains the correct cert/key. If
+                #       a build host is set up with a clean version of
+                #       macOS Sierra (or later) then you will need to
+                #       change this line (and the one for 'codesign'
+                #       command below) to point to right place or else
+                #       pull in the cert/key into the default viewer
+                #       keychain 'viewer.keychain-db' and export it to
+                #       'viewer.keychain'
+                viewer_keychain = os.path.join(home_path, 'Library',
+                                               'Keychains', 'viewer.keychain')
+                if not os.path.isfile( viewer_keychain ):
+                    viewer_keychain += "-db"
+
+                if not os.path.isfile( viewer_keychain ):
+                    raise "No keychain named viewer found"
+                
+                self.run_command(['security', 'unlock-keychain',
+                                  '-p', keychain_pwd, viewer_keychain])
+                # Extend the unlock timeout so the keychain doesn't
+                # relock mid-run while the parallel signers below are
+                # still working through their chunks.
+                self.run_command(['security', 'set-keychain-settings',
+                                  '-lut', '3600', viewer_keychain])
+                sign_retry_wait=15
+                resources = app_in_stage + "/Contents/Resources/"
+
+                # <FS:ND> Even though we got some dylibs in Resources signed by LL, we also got some there that are *NOT*
+                # At least: fmod, growl, GLOD
+                # We could selectively sign those, or repackage them and then sign them. For an easy clean sweet we just resign them al
+                plain_sign = self._find_dylibs([
+                    resources + "llplugin",
+                    resources.rstrip('/'),
+                    resources + "llplugin/lib",
+                    app_in_stage + "/Contents/Frameworks/Chromium Embedded Framework.framework/Libraries",
+                    ])
+
+                # Sign the nested code explicitly, inside-out, instead
+                # of letting codesign --deep re-walk and re-hash every
+                # Mach-O under the outer bundle: the flat dylibs are
+                # already covered by plain_sign above, so list the
+                # frameworks and helper bundles deepest-first here and
+                # finish with the outer app. Skip the CEF framework
+                # symlink inside SLPlugin.app -- its target is signed
+                # via the Contents/Frameworks glob.
+                deep_sign = (
+                    glob.glob(app_in_stage + "/Contents/Frameworks/*.framework") +
+                    [helper for helper in
+                     glob.glob(resources + "SLPlugin.app/Contents/Frameworks/*.app")
+                     if not os.path.islink(helper)] +
+                    [
+                    # <FS:ND> Firestorm does not ship SLVersionChecker
+                    #resources + "updater/SLVersionChecker",
+                    resources + "SLPlugin.app/Contents/MacOS/SLPlugin",
+                    resources + "SLVoice",
+                    app_in_stage,
+                    ])
+                # A file signed on one attempt stays signed: track what
+                # still needs signing so a transient failure (usually
+                # the timestamp service) only re-hashes the stragglers
+                # instead of the whole bundle on retry.
+                plain_remaining = list(plain_sign)
+                deep_remaining = list(deep_sign)
+                for attempt in range(3):
+                    if attempt: # second or subsequent iteration
+                        print("codesign failed, waiting {:d} seconds before retrying".format(sign_retry_wait),
+                              file=sys.stderr)
+                        time.sleep(sign_retry_wait)
+                        sign_retry_wait*=2
+
+                    try:
+                        # Note: See blurb above about names of keychains
+                        # codesign accepts any number of paths per
+                        # invocation, and every spawn costs a fork/exec
+                        # plus a keychain round trip: sign the whole
+                        # flat dylib group with one child. If the batch
+                        # fails, re-sign per file so the offending
+                        # input is named in the error.
+                        plain_command = ['codesign',
+                                         '--force',
+                                         '--timestamp',
+                                         '--keychain', viewer_keychain,
+                                         '--sign', identity]
+                        if plain_remaining:
+                            # codesign is hash-bound per file, so split
+                            # the group across cores and let each worker
+                            # drive its own child. The keychain was
+                            # unlocked once above, so no per-worker
+                            # prompts. Workers call subprocess directly:
+                            # run_command() raising inside a thread
+                            # would tangle the retry loop.
+                            nworkers = min(len(plain_remaining),
+                                           os.cpu_count() or 4)
+                            chunks = [plain_remaining[i::nworkers]
+                                      for i in range(nworkers)]
+                            def sign_chunk(chunk):
+                                print("Running command:",
+                                      shlex.join(plain_command + chunk))
+                                return subprocess.run(
+                                    plain_command + chunk).returncode
+                            with concurrent.futures.ThreadPoolExecutor(
+                                    max_workers=nworkers) as pool:
+                                results = list(pool.map(sign_chunk, chunks))
+                            # keep only the files from failed chunks
+                            plain_remaining = [
+                                signee
+                                for chunk, rc in zip(chunks, results) if rc
+                                for signee in chunk]
+                            # re-sign failures serially so the offending
+                            # file is named in the error
+                            for signee in list(plain_remaining):
+                                self.run_command(plain_command + [signee])
+                                plain_remaining.remove(signee)
+                        while deep_remaining:
+                            self.run_command(
+                                ['codesign',
+                                 '--verbose',
+                                 '--force',
+                                 '--entitlements', self.src_path_of("slplugin.entitlements"),
+                                 '--options', 'runtime',
+                                 '--keychain', viewer_keychain,
+                                 '--sign', identity,
+                                 deep_remaining[0]])
+                            deep_remaining.pop(0)
+                        break # if no exception was raised, the codesign worked
+                    except ManifestError as err:
+                        # 'err' goes out of scope
+                        sign_failed = err
+                else:
+                    print("Maximum codesign attempts exceeded; giving up", file=sys.stderr)
+                    raise sign_failed
+                # <FS:ND> This fails sometimes and works other times. Even when notarization (down below) is a success
+                # Remove it for now and investigate after we did notarize  a few times
+                #self.run_command(['spctl', '-a', '-texec', '-vvvv', app_in_stage])
+                notarize_after_create = True
+
         self.run_command(['hdiutil', 'create', sparsename,
+                          '-srcfolder', stagingdir,
                           '-volname', volname, '-fs', 'HFS+',
                           '-type', 'SPARSE', '-megabytes', '1300',
                           '-layout', 'SPUD'])
 
+        if notarize_after_create:
+            # see start_notarize(): deferred so its scratch zip can't be
+            # imaged along with the staging directory
+            notarize_proc = start_notarize()
+
         # mount the image and get the name of the mount point and device node
         try:
-            hdi_output = subprocess.check_output(['hdiutil', 'attach', '-private', sparsename], text=True)
+            # decode once, by hand: the locale-driven text machinery has
+            # no business guessing at hdiutil's output
+            hdi_output = subprocess.check_output(
+                ['hdiutil', 'attach', '-private', sparsename]
+                ).decode('utf-8', 'replace')
         except subprocess.CalledProcessError as err:
             sys.exit("failed to mount image at '%s'" % sparsename)
             
@@ -1839,9 +2238,9 @@ class Darwin_x86_64_Manifest(ViewerManifest):
             devfile = re.search(r"/dev/disk([0-9]+)[^s]", hdi_output).group(0).strip()
             volpath = re.search(r'HFS\s+(.+)', hdi_output).group(1).strip()
 
-            # Copy everything in to the mounted .dmg
-
-            app_name = self.app_name()
+            # The app itself is already in the image via -srcfolder
+            # above; only the Finder dressing still happens in the
+            # mounted volume.
 
             # Hack:
             # Because there is no easy way to coerce the Finder into positioning
@@ -1862,7 +2261,7 @@ class Darwin_x86_64_Manifest(ViewerManifest):
                 dmg_template = os.path.join ('installers', 'darwin', 'release-dmg')
                 print ("Not found, trying template directory", dmg_template)
 
-            for s,d in list({self.get_dst_prefix():app_name + ".app",
+            for s,d in list({
                         #os.path.join(dmg_template, "_VolumeIcon.icns"): ".VolumeIcon.icns",
                         os.path.join(dmg_template, "background.png"): "background.png",
                         os.path.join(dmg_template, "_DS_Store"): ".DS_Store"}.items()):
@@ -1892,148 +2291,79 @@ class Darwin_x86_64_Manifest(ViewerManifest):
             self.copy_action(self.src_path_of(os.path.join(dmg_template, "_VolumeIcon.icns")),
                 os.path.join(volpath, ".VolumeIcon.icns"))
 
-            # Hide the background image, DS_Store file, and volume icon file (set their "visible" bit)
-            for f in ".VolumeIcon.icns", "background.png", ".DS_Store":
-                pathname = os.path.join(volpath, f)
-                self.run_command(['SetFile', '-a', 'V', pathname])
-
-            # Set the alias file's alias and custom icon bits
-            self.run_command(['SetFile', '-a', 'AC', os.path.join(volpath, "Applications")])
-
-            # Set the disk image root's custom icon bit
-            self.run_command(['SetFile', '-a', 'C', volpath])
-
-            # Sign the app if requested; 
-            # do this in the copy that's in the .dmg so that the extended attributes used by 
-            # the signature are preserved; moving the files using python will leave them behind
-            # and invalidate the signatures.
-            if 'signature' in self.args:
-                app_in_dmg=os.path.join(volpath,self.app_name()+".app")
-                print("Attempting to sign '%s'" % app_in_dmg)
-                identity = self.args['signature']
-                if identity == '':
-                    identity = 'Developer ID Application'
-
-                # Look for an environment variable set via build.sh when running in Team City.
-                try:
-                    build_secrets_checkout = os.environ['build_secrets_checkout']
-                except KeyError:
-                    pass
-                else:
-                    # variable found so use it to unlock keychain followed by codesign
-                    home_path = os.environ['HOME']
-                    keychain_pwd_path = os.path.join(build_secrets_checkout,'code-signing-osx','password.txt')
-                    keychain_pwd = open(keychain_pwd_path).read().rstrip()
-
-                    # Note: As of macOS Sierra, keychains are created with
-                    #       names postfixed with '-db' so for example, the SL
-                    #       Viewer keychain would by default be found in
-                    #       ~/Library/Keychains/viewer.keychain-db instead of
-                    #       just ~/Library/Keychains/viewer.keychain in
-                    #       earlier versions.
-                    #
-                    #       Because we have old OS files from previous
-                    #       versions of macOS on the build hosts, the
-                    #       configurations are different on each host. Some
-                    #       have viewer.keychain, some have viewer.keychain-db
-                    #       and some have both. As you can see in the line
-                    #       below, this script expects the Linden Developer
-                    #       cert/keys to be in viewer.keychain.
-                    #
-                    #       To correctly sign builds you need to make sure
-                    #       ~/Library/Keychains/viewer.keychain exists on the
-                    #       host and that it contains the correct cert/key. If
-                    #       a build host is set up with a clean version of
-                    #       macOS Sierra (or later) then you will need to
-                    #       change this line (and the one for 'codesign'
-                    #       command below) to point to right place or else
-                    #       pull in the cert/key into the default viewer
-                    #       keychain 'viewer.keychain-db' and export it to
-                    #       'viewer.keychain'
-                    viewer_keychain = os.path.join(home_path, 'Library',
-                                                   'Keychains', 'viewer.keychain')
-                    if not os.path.isfile( viewer_keychain ):
-                        viewer_keychain += "-db"
-
-                    if not os.path.isfile( viewer_keychain ):
-                        raise "No keychain named viewer found"
-                    
-                    self.run_command(['security', 'unlock-keychain',
-                                      '-p', keychain_pwd, viewer_keychain])
-                    sign_retry_wait=15
-                    resources = app_in_dmg + "/Contents/Resources/"
-                    plain_sign = glob.glob(resources + "llplugin/*.dylib")
-
-                    # <FS:ND> Even though we got some dylibs in Resources signed by LL, we also got some there that are *NOT*
-                    # At least: fmod, growl, GLOD
-                    # We could selectively sign those, or repackage them and then sign them. For an easy clean sweet we just resign them al
-                    plain_sign += glob.glob(resources + "*.dylib")
-                    plain_sign += glob.glob(resources + "llplugin/lib/*.dylib")
-                    plain_sign += glob.glob( app_in_dmg + "/Contents/Frameworks/Chromium Embedded Framework.framework/Libraries/*.dylib" )
-
-                    deep_sign = [
-                        # <FS:ND> Firestorm does not ship SLVersionChecker
-                        #resources + "updater/SLVersionChecker",
-                        resources + "SLPlugin.app/Contents/MacOS/SLPlugin",
-                        resources + "SLVoice",
-                        app_in_dmg,
-                        ]
-                    for attempt in range(3):
-                        if attempt: # second or subsequent iteration
-                            print("codesign failed, waiting {:d} seconds before retrying".format(sign_retry_wait),
-                                  file=sys.stderr)
-                            time.sleep(sign_retry_wait)
-                            sign_retry_wait*=2
-
-                        try:
-                            # Note: See blurb above about names of keychains
-                            for signee in plain_sign:
-                                self.run_command(
-                                    ['codesign',
-                                     '--force',
-                                     '--timestamp',
-                                     '--keychain', viewer_keychain,
-                                     '--sign', identity,
-                                     signee])
-                            for signee in deep_sign:
-                                self.run_command(
-                                    ['codesign',
-                                     '--verbose',
-                                     '--deep',
-                                     '--force',
-                                     '--entitlements', self.src_path_of("slplugin.entitlements"),
-                                     '--options', 'runtime',
-                                     '--keychain', viewer_keychain,
-                                     '--sign', identity,
-                                     signee])
-                            break # if no exception was raised, the codesign worked
-                        except ManifestError as err:
-                            # 'err' goes out of scope
-                            sign_failed = err
-                    else:
-                        print("Maximum codesign attempts exceeded; giving up", file=sys.stderr)
-                        raise sign_failed
-                    # <FS:ND> This fails sometimes and works other times. Even when notarization (down below) is a success
-                    # Remove it for now and investigate after we did notarize  a few times
-                    #self.run_command(['spctl', '-a', '-texec', '-vvvv', app_in_dmg])
-                    self.run_command([self.src_path_of("installers/darwin/apple-notarize.sh"), app_in_dmg])
+            # Hide the background image, DS_Store file, and volume icon file
+            # (set their "visible" bit), set the alias file's alias and
+            # custom icon bits, and set the disk image root's custom icon
+            # bit. The three attribute groups touch disjoint paths, so the
+            # SetFile children run concurrently.
+            self._popen_batch([
+                ['SetFile', '-a', 'V'] +
+                [os.path.join(volpath, f) for f in
+                 (".VolumeIcon.icns", "background.png", ".DS_Store")],
+                ['SetFile', '-a', 'AC', os.path.join(volpath, "Applications")],
+                ['SetFile', '-a', 'C', volpath],
+                ])
+
+            # The notarize submission has been running against the
+            # staged app since signing finished, overlapped with the
+            # image build and the Finder work above. Collect it now:
+            # the ticket it staples (Contents/CodeResources) lands in
+            # the staging tree after -srcfolder already copied it, so
+            # bring it into the volume by hand before the image is
+            # detached and converted.
+            if notarize_proc is not None:
+                print("Waiting for notarization to finish")
+                if notarize_proc.wait() != 0:
+                    raise ManifestError(
+                        "Command %s returned non-zero status (%s)"
+                        % (notarize_proc.args, notarize_proc.returncode))
+                ticket = os.path.join(app_in_stage,
+                                      'Contents', 'CodeResources')
+                if os.path.isfile(ticket):
+                    self.copy_action(
+                        ticket,
+                        os.path.join(volpath, app_name + ".app",
+                                     'Contents', 'CodeResources'))
 
         finally:
-            # Unmount the image even if exceptions from any of the above 
+            # Unmount the image even if exceptions from any of the above.
+            # Transient detach failures (the Finder still holding the
+            # volume) usually clear within a few hundred ms, so back off
+            # exponentially from 100 ms instead of sleeping a flat second,
+            # and check whether the device went away on its own before
+            # spending another attempt on it.
+            detach_wait = 0.1
             for tries in range(10):
                 try:
                     self.run_command(['hdiutil', 'detach', '-force', devfile])
                     break # Exit loop if detach worked
                 except ManifestError as err:
                     print(f"detach failed on attempt {tries}")
-                    time.sleep(1)
+                    time.sleep(detach_wait)
+                    detach_wait = min(detach_wait * 2, 2.0)
+                    info = subprocess.run(['hdiutil', 'info'],
+                                          stdout=subprocess.PIPE)
+                    if devfile.encode() not in info.stdout:
+                        print("volume detached on its own")
+                        break
 
         print("Converting temp disk image to final disk image")
+        if self.args['buildtype'].lower() == 'release':
+            # zlib-level=9 buys ~5% size over level 6 for 2-3x the (single
+            # threaded) CPU; DMG conversion often dominates the package
+            # phase, so take the pragmatic default
+            zlib_level = '6'
+        else:
+            # dev builds don't ship: spend as little as possible on the
+            # compression pass and keep the artifact format the same
+            zlib_level = '1'
         self.run_command(['hdiutil', 'convert', sparsename, '-format', 'UDZO',
-                          '-imagekey', 'zlib-level=9', '-o', finalname])
-        # get rid of the temp file
+                          '-imagekey', 'zlib-level=' + zlib_level,
+                          '-o', finalname])
+        # get rid of the temp file and the staging tree
         self.package_file = finalname
         self.remove(sparsename)
+        shutil.rmtree(stagingdir, ignore_errors=True)
         self.fs_save_osx_symbols()
 
 
@@ -2054,220 +2384,188 @@ class LinuxManifest(ViewerManifest):
         relpkgdir = os.path.join(pkgdir, "lib", "release")
         debpkgdir = os.path.join(pkgdir, "lib", "debug")
 
-        self.path("licenses-linux.txt","licenses.txt")
-        self.path("VivoxAUP.txt")
-        self.path("LGPL-license.txt")
-        self.path("res/firestorm_icon.png","firestorm_icon.png")
-        with self.prefix("linux_tools"):
-            self.path("client-readme.txt","README-linux.txt")
-            self.path("FIRESTORM_DESKTOPINSTALL.txt","FIRESTORM_DESKTOPINSTALL.txt")
-            self.path("client-readme-voice.txt","README-linux-voice.txt")
-            self.path("client-readme-joystick.txt","README-linux-joystick.txt")
-            self.path("wrapper.sh","firestorm")
-            with self.prefix(dst="etc"):
-                self.path("handle_secondlifeprotocol.sh")
-                self.path("register_secondlifeprotocol.sh")
-                self.path("refresh_desktop_app_entry.sh")
-                self.path("launch_url.sh")
-            self.path("install.sh")
-
-        with self.prefix(dst="bin"):
-            self.path( os.path.join(os.pardir,'build_data.json'), "build_data.json" )
-            self.path("firestorm-bin","do-not-directly-run-firestorm-bin")
-            self.path("../linux_crash_logger/linux-crash-logger","linux-crash-logger.bin")
-            self.path2basename("../llplugin/slplugin", "SLPlugin")
-            #this copies over the python wrapper script, associated utilities and required libraries, see SL-321, SL-322 and SL-323
-            # <FS:Ansariel> Remove VMP
-            # with self.prefix(src="../viewer_components/manager", dst=""):
-            #     self.path("*.py")
-            # </FS:Ansariel> Remove VMP
-
-        # recurses, packaged again
-        self.path("res-sdl")
-
-        # Get the icons based on the channel type
-        icon_path = self.icon_path()
-        print("DEBUG: icon_path '%s'" % icon_path)
-        with self.prefix(src=icon_path) :
-            self.path("firestorm_256.png","firestorm_48.png")
-            #with self.prefix(dst="res-sdl") :
-            #    self.path("firestorm_256.bmp","ll_icon.BMP")
-
-        # plugins
-        with self.prefix(src=os.path.join(self.args['build'], os.pardir, 'media_plugins'), dst="bin/llplugin"):
-            self.path("gstreamer10/libmedia_plugin_gstreamer10.so", "libmedia_plugin_gstreamer.so")
-            self.path("cef/libmedia_plugin_cef.so", "libmedia_plugin_cef.so" )
-
-        # CEF files 
-        with self.prefix(src=os.path.join(pkgdir, 'lib', 'release'), dst="lib"):
-            self.path( "libcef.so" )
-            self.path( "libEGL.so" )
-            self.path( "libGLESv2.so" )
-            self.path( "libvk_swiftshader.so" )
-            self.path_optional( "libminigbm.so" )
-
-        with self.prefix(src=os.path.join(pkgdir, 'bin', 'release'), dst="bin"):
-            self.path( "chrome-sandbox" )
-            self.path( "dullahan_host" )
-            self.path( "snapshot_blob.bin" )
-            self.path( "v8_context_snapshot.bin" )
-        with self.prefix(src=os.path.join(pkgdir, 'bin', 'release'), dst="lib"):
-            self.path( "snapshot_blob.bin" )
-            self.path( "v8_context_snapshot.bin" )
-
-        with self.prefix(src=os.path.join(pkgdir, 'resources'), dst="bin"):
-            self.path( "chrome_100_percent.pak" )
-            self.path( "chrome_200_percent.pak" )
-            self.path( "resources.pak" )
-            self.path( "icudtl.dat" )
-        with self.prefix(src=os.path.join(pkgdir, 'resources'), dst="lib"):
-            self.path( "chrome_100_percent.pak" )
-            self.path( "chrome_200_percent.pak" )
-            self.path( "resources.pak" )
-            self.path( "icudtl.dat" )
-
-        with self.prefix(src=os.path.join(pkgdir, 'resources', 'locales'), dst=os.path.join('lib', 'locales')):
-            self.path("am.pak")
-            self.path("ar.pak")
-            self.path("bg.pak")
-            self.path("bn.pak")
-            self.path("ca.pak")
-            self.path("cs.pak")
-            self.path("da.pak")
-            self.path("de.pak")
-            self.path("el.pak")
-            self.path("en-GB.pak")
-            self.path("en-US.pak")
-            self.path("es-419.pak")
-            self.path("es.pak")
-            self.path("et.pak")
-            self.path("fa.pak")
-            self.path("fi.pak")
-            self.path("fil.pak")
-            self.path("fr.pak")
-            self.path("gu.pak")
-            self.path("he.pak")
-            self.path("hi.pak")
-            self.path("hr.pak")
-            self.path("hu.pak")
-            self.path("id.pak")
-            self.path("it.pak")
-            self.path("ja.pak")
-            self.path("kn.pak")
-            self.path("ko.pak")
-            self.path("lt.pak")
-            self.path("lv.pak")
-            self.path("ml.pak")
-            self.path("mr.pak")
-            self.path("ms.pak")
-            self.path("nb.pak")
-            self.path("nl.pak")
-            self.path("pl.pak")
-            self.path("pt-BR.pak")
-            self.path("pt-PT.pak")
-            self.path("ro.pak")
-            self.path("ru.pak")
-            self.path("sk.pak")
-            self.path("sl.pak")
-            self.path("sr.pak")
-            self.path("sv.pak")
-            self.path("sw.pak")
-            self.path("ta.pak")
-            self.path("te.pak")
-            self.path("th.pak")
-            self.path("tr.pak")
-            self.path("uk.pak")
-            self.path("vi.pak")
-            self.path("zh-CN.pak")
-            self.path("zh-TW.pak")
-
-        # llcommon
-        #if not self.path("../llcommon/libllcommon.so", "lib/libllcommon.so"):
-        #    print("Skipping llcommon.so (assuming llcommon was linked statically))"
-
-        self.path("featuretable_linux.txt")
-        self.path("cube.dae")
-
-        with self.prefix(src=pkgdir, dst="bin"):
-            self.path("ca-bundle.crt")
-
-        with self.prefix(src=os.path.join(pkgdir, 'lib', 'release'), dst="lib"):
-            # self.path("libfreetype.so*")
-            self.path("libapr-1.so*")
-            self.path("libaprutil-1.so*")
-            #self.path("libboost_context-mt.so*")
-            #self.path("libboost_filesystem-mt.so*")
-            #self.path("libboost_program_options-mt.so*")
-            #self.path("libboost_regex-mt.so*")
-            #self.path("libboost_signals-mt.so*")
-            #self.path("libboost_system-mt.so*")
-            #self.path("libboost_thread-mt.so*")
-            #self.path("libboost_chrono-mt.so*") #<FS:TM> FS spcific
-            #self.path("libboost_date_time-mt.so*") #<FS:TM> FS spcific
-            #self.path("libboost_wave-mt.so*") #<FS:TM> FS spcific
-            #self.path("libcollada14dom.so*")
-            #self.path("libdb*.so*")
-            #self.path("libcrypto.so*")
-            #self.path("libexpat.so*")
-            #self.path("libssl.so*")
-            #self.path("libGLOD.so")
-            #self.fs_path("libminizip.so")
-            self.path("libuuid.so*")
-            self.path("libSDL*.so*")
-            self.path_optional("libdirectfb*.so*")
-            self.path_optional("libfusion*.so*")
-            self.path_optional("libdirect*.so*")
-            self.path_optional("libopenjpeg.so*")
-            self.path("libalut.so*")
-            #self.path("libpng15.so.15") #use provided libpng to workaround incompatible system versions on some distros
-            #self.path("libpng15.so.15.13.0") #use provided libpng to workaround incompatible system versions on some distros
-            #self.path("libpng15.so.15.1.0") #use provided libpng to workaround incompatible system versions on some distros
-            self.path("libopenal.so", "libopenal.so.1") # Install as versioned file in case it's missing from the 3p- and won't get copied below
-            self.path("libopenal.so*")
-            #self.path("libnotify.so.1.1.2", "libnotify.so.1") # LO - uncomment when testing libnotify(growl) on linux
-            #self.path("libpangox-1.0.so*")
-            # KLUDGE: As of 2012-04-11, the 'fontconfig' package installs
-            # libfontconfig.so.1.4.4, along with symlinks libfontconfig.so.1
-            # and libfontconfig.so. Before we added support for library-file
-            # wildcards, though, this self.path() call specifically named
-            # libfontconfig.so.1.4.4 WITHOUT also copying the symlinks. When I
-            # (nat) changed the call to self.path("libfontconfig.so.*"), we
-            # ended up with the libfontconfig.so.1 symlink in the target
-            # directory as well. But guess what! At least on Ubuntu 10.04,
-            # certain viewer fonts look terrible with libfontconfig.so.1
-            # present in the target directory. Removing that symlink suffices
-            # to improve them. I suspect that means we actually do better when
-            # the viewer fails to find our packaged libfontconfig.so*, falling
-            # back on the system one instead -- but diagnosing and fixing that
-            # is a bit out of scope for the present project. Meanwhile, this
-            # particular wildcard specification gets us exactly what the
-            # previous call did, without having to explicitly state the
-            # version number.
-            #self.path("libfontconfig.so.*.*")
-
-            self.path_optional("libjemalloc.so*")
+        # construct() here is nothing but file copies -- no command runs
+        # against the destination tree until package_finish() -- so one
+        # deferred batch drains every copy below on a single thread pool
+        # instead of file by file.
+        with self.deferred_copy_batch():
+            self.path("licenses-linux.txt","licenses.txt")
+            self.path("VivoxAUP.txt")
+            self.path("LGPL-license.txt")
+            self.path("res/firestorm_icon.png","firestorm_icon.png")
+            with self.prefix("linux_tools"):
+                self.path("client-readme.txt","README-linux.txt")
+                self.path("FIRESTORM_DESKTOPINSTALL.txt","FIRESTORM_DESKTOPINSTALL.txt")
+                self.path("client-readme-voice.txt","README-linux-voice.txt")
+                self.path("client-readme-joystick.txt","README-linux-joystick.txt")
+                self.path("wrapper.sh","firestorm")
+                with self.prefix(dst="etc"):
+                    self.path("handle_secondlifeprotocol.sh")
+                    self.path("register_secondlifeprotocol.sh")
+                    self.path("refresh_desktop_app_entry.sh")
+                    self.path("launch_url.sh")
+                self.path("install.sh")
+
+            with self.prefix(dst="bin"):
+                self.path( os.path.join(os.pardir,'build_data.json'), "build_data.json" )
+                self.path("firestorm-bin","do-not-directly-run-firestorm-bin")
+                self.path("../linux_crash_logger/linux-crash-logger","linux-crash-logger.bin")
+                self.path2basename("../llplugin/slplugin", "SLPlugin")
+                #this copies over the python wrapper script, associated utilities and required libraries, see SL-321, SL-322 and SL-323
+                # <FS:Ansariel> Remove VMP
+                # with self.prefix(src="../viewer_components/manager", dst=""):
+                #     self.path("*.py")
+                # </FS:Ansariel> Remove VMP
 
-        # WebRTC libraries
-        with self.prefix(src=os.path.join(self.args['build'], os.pardir,
-                        'sharedlibs', 'lib'), dst='lib'):
-            for libfile in (
-                'libllwebrtc.so',
-            ):
-                self.path(libfile)
+            # recurses, packaged again
+            self.path("res-sdl")
+
+            # Get the icons based on the channel type
+            icon_path = self.icon_path()
+            print("DEBUG: icon_path '%s'" % icon_path)
+            with self.prefix(src=icon_path) :
+                self.path("firestorm_256.png","firestorm_48.png")
+                #with self.prefix(dst="res-sdl") :
+                #    self.path("firestorm_256.bmp","ll_icon.BMP")
+
+            # plugins
+            with self.prefix(src=os.path.join(self.args['build'], os.pardir, 'media_plugins'), dst="bin/llplugin"):
+                self.path("gstreamer10/libmedia_plugin_gstreamer10.so", "libmedia_plugin_gstreamer.so")
+                self.path("cef/libmedia_plugin_cef.so", "libmedia_plugin_cef.so" )
+
+            # CEF files 
+            with self.prefix(src=os.path.join(pkgdir, 'lib', 'release'), dst="lib"):
+                self.path( "libcef.so" )
+                self.path( "libEGL.so" )
+                self.path( "libGLESv2.so" )
+                self.path( "libvk_swiftshader.so" )
+                self.path_optional( "libminigbm.so" )
+
+            with self.prefix(src=os.path.join(pkgdir, 'bin', 'release'), dst="bin"):
+                self.path( "chrome-sandbox" )
+                self.path( "dullahan_host" )
+                self.path( "snapshot_blob.bin" )
+                self.path( "v8_context_snapshot.bin" )
+            with self.prefix(src=os.path.join(pkgdir, 'bin', 'release'), dst="lib"):
+                self.path( "snapshot_blob.bin" )
+                self.path( "v8_context_snapshot.bin" )
+
+            with self.prefix(src=os.path.join(pkgdir, 'resources'), dst="bin"):
+                self.path( "chrome_100_percent.pak" )
+                self.path( "chrome_200_percent.pak" )
+                self.path( "resources.pak" )
+                self.path( "icudtl.dat" )
+            with self.prefix(src=os.path.join(pkgdir, 'resources'), dst="lib"):
+                self.path( "chrome_100_percent.pak" )
+                self.path( "chrome_200_percent.pak" )
+                self.path( "resources.pak" )
+                self.path( "icudtl.dat" )
+
+            # same locale whitelist the Windows manifest uses; one batched
+            # paths() call (single prefix push, one deferred drain) instead
+            # of ~50 separate path() invocations
+            self.paths((locale + ".pak" for locale in CEF_LOCALE_PAKS),
+                       src=os.path.join(pkgdir, 'resources', 'locales'),
+                       dst=os.path.join('lib', 'locales'))
+
+            # llcommon
+            #if not self.path("../llcommon/libllcommon.so", "lib/libllcommon.so"):
+            #    print("Skipping llcommon.so (assuming llcommon was linked statically))"
+
+            self.path("featuretable_linux.txt")
+            self.path("cube.dae")
+
+            with self.prefix(src=pkgdir, dst="bin"):
+                self.path("ca-bundle.crt")
+
+            with self.prefix(src=os.path.join(pkgdir, 'lib', 'release'), dst="lib"):
+                # self.path("libfreetype.so*")
+                self.path("libapr-1.so*")
+                self.path("libaprutil-1.so*")
+                #self.path("libboost_context-mt.so*")
+                #self.path("libboost_filesystem-mt.so*")
+                #self.path("libboost_program_options-mt.so*")
+                #self.path("libboost_regex-mt.so*")
+                #self.path("libboost_signals-mt.so*")
+                #self.path("libboost_system-mt.so*")
+                #self.path("libboost_thread-mt.so*")
+                #self.path("libboost_chrono-mt.so*") #<FS:TM> FS spcific
+                #self.path("libboost_date_time-mt.so*") #<FS:TM> FS spcific
+                #self.path("libboost_wave-mt.so*") #<FS:TM> FS spcific
+                #self.path("libcollada14dom.so*")
+                #self.path("libdb*.so*")
+                #self.path("libcrypto.so*")
+                #self.path("libexpat.so*")
+                #self.path("libssl.so*")
+                #self.path("libGLOD.so")
+                #self.fs_path("libminizip.so")
+                self.path("libuuid.so*")
+                self.path("libSDL*.so*")
+                self.path_optional("libdirectfb*.so*")
+                self.path_optional("libfusion*.so*")
+                self.path_optional("libdirect*.so*")
+                self.path_optional("libopenjpeg.so*")
+                self.path("libalut.so*")
+                #self.path("libpng15.so.15") #use provided libpng to workaround incompatible system versions on some distros
+                #self.path("libpng15.so.15.13.0") #use provided libpng to workaround incompatible system versions on some distros
+                #self.path("libpng15.so.15.1.0") #use provided libpng to workaround incompatible system versions on some distros
+                self.path("libopenal.so", "libopenal.so.1") # Install as versioned file in case it's missing from the 3p- and won't get copied below
+                self.path("libopenal.so*")
+                #self.path("libnotify.so.1.1.2", "libnotify.so.1") # LO - uncomment when testing libnotify(growl) on linux
+                #self.path("libpangox-1.0.so*")
+                # KLUDGE: As of 2012-04-11, the 'fontconfig' package installs
+                # libfontconfig.so.1.4.4, along with symlinks libfontconfig.so.1
+                # and libfontconfig.so. Before we added support for library-file
+                # wildcards, though, this self.path() call specifically named
+                # libfontconfig.so.1.4.4 WITHOUT also copying the symlinks. When I
+                # (nat) changed the call to self.path("libfontconfig.so.*"), we
+                # ended up with the libfontconfig.so.1 symlink in the target
+                # directory as well. But guess what! At least on Ubuntu 10.04,
+                # certain viewer fonts look terrible with libfontconfig.so.1
+                # present in the target directory. Removing that symlink suffices
+                # to improve them. I suspect that means we actually do better when
+                # the viewer fails to find our packaged libfontconfig.so*, falling
+                # back on the system one instead -- but diagnosing and fixing that
+                # is a bit out of scope for the present project. Meanwhile, this
+                # particular wildcard specification gets us exactly what the
+                # previous call did, without having to explicitly state the
+                # version number.
+                #self.path("libfontconfig.so.*.*")
+
+                self.path_optional("libjemalloc.so*")
 
-            # Vivox runtimes
-            # Currentelly, the 32-bit ones will work with a 64-bit client.
-        with self.prefix(src=os.path.join(pkgdir, 'bin32' ), dst="bin"):
-            self.path("SLVoice")
-        with self.prefix(src=os.path.join(pkgdir ), dst="bin"):
-            self.path("win32")
-            self.path("win64")
-
-        with self.prefix(src=os.path.join(pkgdir, 'lib32' ), dst="lib32"):
-            self.path("libvivox*")
-            self.path("libortp*")
-            self.path("libsndfile*")
-            self.path("*.crt")
+            # WebRTC libraries
+            with self.prefix(src=os.path.join(self.args['build'], os.pardir,
+                            'sharedlibs', 'lib'), dst='lib'):
+                for libfile in (
+                    'libllwebrtc.so',
+                ):
+                    self.path(libfile)
+
+                # Vivox runtimes
+                # Currentelly, the 32-bit ones will work with a 64-bit client.
+            with self.prefix(src=os.path.join(pkgdir, 'bin32' ), dst="bin"):
+                self.path("SLVoice")
+            with self.prefix(src=os.path.join(pkgdir ), dst="bin"):
+                self.path("win32")
+                self.path("win64")
+
+            with self.prefix(src=os.path.join(pkgdir, 'lib32' ), dst="lib32"):
+                self.path("libvivox*")
+                self.path("libortp*")
+                self.path("libsndfile*")
+                self.path("*.crt")
+
+
+    def find_xargs(self, find_args, cmd_args):
+        """find ... -print0 | xargs -0 -P<ncores>: batches a few dozen files
+        per child and runs the children in parallel, where find -exec {} ;
+        forks once per file, serially."""
+        ncpu = str(os.cpu_count() or 4)
+        self.run_command_shell(
+            shlex.join(['find'] + find_args + ['-print0']) + ' | ' +
+            shlex.join(['xargs', '-0', '-r', '-P', ncpu, '-n', '64']
+                       + cmd_args))
 
     def package_finish(self):
         # a standard map of strings for replacing in the templates
@@ -2281,12 +2579,11 @@ class LinuxManifest(ViewerManifest):
         self.fs_save_linux_symbols() # <FS:ND/> Package symbols, add debug link
 
         # Fix access permissions
-        self.run_command(['find', self.get_dst_prefix(),
-                          '-type', 'd', '-exec', 'chmod', '755', '{}', ';'])
+        self.find_xargs([self.get_dst_prefix(), '-type', 'd'],
+                        ['chmod', '755'])
         for old, new in ('0700', '0755'), ('0500', '0555'), ('0600', '0644'), ('0400', '0444'):
-            self.run_command(['find', self.get_dst_prefix(),
-                              '-type', 'f', '-perm', old,
-                              '-exec', 'chmod', new, '{}', ';'])
+            self.find_xargs([self.get_dst_prefix(), '-type', 'f', '-perm', old],
+                            ['chmod', new])
         self.package_file = installer_name + '.tar.xz'
 
         # temporarily move directory tree so that it has the right
@@ -2299,8 +2596,12 @@ class LinuxManifest(ViewerManifest):
             if self.args['buildtype'].lower() == 'release':
                 # --numeric-owner hides the username of the builder for
                 # security etc.
+                # xz is CPU-bound and single-threaded by default; -T0 lets
+                # it split the payload across every core (at the cost of
+                # slightly larger output from per-block flushes)
                 self.run_command(['tar', '-C', self.get_build_prefix(),
-                                  '--numeric-owner', self.fs_linux_tar_excludes(), '-caf',
+                                  '--numeric-owner', self.fs_linux_tar_excludes(),
+                                  '-I', 'xz -T0', '-cf',
                                  tempname + '.tar.xz', installer_name])
             else:
                 print("Skipping %s.tar.xz for non-Release build (%s)" % \
@@ -2312,14 +2613,14 @@ class LinuxManifest(ViewerManifest):
         if self.args['buildtype'].lower() == 'release' and self.is_packaging_viewer():
             print("* Going strip-crazy on the packaged binaries, since this is a RELEASE build")
             # makes some small assumptions about our packaged dir structure
-            self.run_command(
-                ["find"] +
+            self.find_xargs(
                 [os.path.join(self.get_dst_prefix(), dir) for dir in ('bin', 'lib')] +
                 # <FS:Ansariel> Remove VMP
                 # ['-type', 'f', '!', '-name', '*.py',
                 ['-type', 'f', "!", "-name", "*.dat", "!", "-name", "*.pak", "!", "-name", "*.bin", "!", "-name", "*.lib", "!", "-name", "*.pdb",
                 # </FS:Ansariel> Remove VMP
-                 '!', '-name', 'update_install', '-exec', 'strip', '-S', '{}', ';'])
+                 '!', '-name', 'update_install'],
+                ['strip', '-S'])
 
 class Linux_i686_Manifest(LinuxManifest):
     address_size = 32
@@ -2374,20 +2675,16 @@ class Linux_i686_Manifest(LinuxManifest):
 
             try:
                 self.path("libtcmalloc.so*") #formerly called google perf tools
-                pass
-            except:
+            except MissingError:
                 print("tcmalloc files not found, skipping")
-                pass
 
             # if self.args['fmodstudio'] == 'ON':
             if self.args['fmodstudio'].lower() == 'on':
                 try:
                     self.path("libfmod.so")
                     self.path("libfmod.so*")
-                    pass
-                except:
+                except MissingError:
                     print("Skipping libfmod.so - not found")
-                    pass
 
         # Vivox runtimes
         with self.prefix(src=relpkgdir, dst="bin"):
@@ -2426,10 +2723,8 @@ class Linux_x86_64_Manifest(LinuxManifest):
                 try:
                     self.path("libfmod.so")
                     self.path("libfmod.so*")
-                    pass
-                except:
+                except MissingError:
                     print ("Skipping libfmod.so - not found")
-                    pass
 
         with self.prefix(dst="bin"):
             self.path2basename("../llplugin/slplugin", "SLPlugin")
@@ -2442,10 +2737,24 @@ def symlinkf(src, dst):
     """
     Like ln -sf, but uses os.symlink() instead of running ln.
     """
+    # Same fast path as ViewerManifest._symlinkf(): on incremental runs
+    # the link is usually already correct, and one readlink(2) both
+    # detects that and doubles as the existence check.
+    try:
+        if os.readlink(dst) == src:
+            return
+    except OSError:
+        pass
+    # Ensure the parent directory up front -- one mkdir(2), EEXIST handled
+    # in C -- instead of diagnosing a missing parent after the fact with a
+    # stat walk up the tree.
+    parent = os.path.dirname(dst)
+    if parent:
+        os.makedirs(parent, exist_ok=True)
     try:
         os.symlink(src, dst)
     except OSError as err:
-        if err.errno != errno.EEXIST:
+        if err.errno != _EEXIST:
             raise
         # We could just blithely attempt to remove and recreate the target
         # file, but that strategy doesn't work so well if we don't have
@@ -2460,32 +2769,30 @@ def symlinkf(src, dst):
                 os.remove(dst)
                 os.symlink(src, dst)
         elif os.path.isdir(dst):
+            # a real directory (the islink branch above already caught
+            # symlinks, so rmtree can't traverse through one); an empty
+            # one costs a single rmdir(2)
             print ("Requested symlink (%s) exists but is a directory; replacing" % dst)
-            shutil.rmtree(dst)
+            try:
+                os.rmdir(dst)
+            except OSError:
+                shutil.rmtree(dst)
             os.symlink(src, dst)
         elif os.path.exists(dst):
             print ("Requested symlink (%s) exists but is a file; replacing" % dst)
             os.remove(dst)
             os.symlink(src, dst)
         else:
-            # see if the problem is that the parent directory does not exist
-            # and try to explain what is missing
-            (parent, tail) = os.path.split(dst)
-            while not os.path.exists(parent):
-                (parent, tail) = os.path.split(parent)
-            if tail:
-                raise Exception("Requested symlink (%s) cannot be created because %s does not exist"
-                                % os.path.join(parent, tail))
-            else:
-                raise
+            # the parent was created above, so this is a race; out of ideas
+            raise
 # </FS:Ansariel> Added back for Mac compatibility reason
 
 if __name__ == "__main__":
     # Report our own command line so that, in case of trouble, a developer can
     # manually rerun the same command.
-    print(('%s \\\n%s' %
-          (sys.executable,
-           ' '.join((("'%s'" % arg) if ' ' in arg else arg) for arg in sys.argv))))
+    # shlex.join() also quotes args the hand-rolled version mishandled
+    # (tabs, embedded quotes), so the reported line actually reruns.
+    print('%s \\\n%s' % (sys.executable, shlex.join(sys.argv)))
     # fmodstudio and openal can be used simultaneously and controled by environment
     extra_arguments = [
         dict(name='bugsplat', description="""BugSplat database to which to post crashes,
@@ -2499,5 +2806,3 @@ if __name__ == "__main__":
         main(extra=extra_arguments)
     except (ManifestError, MissingError) as err:
         sys.exit("\nviewer_manifest.py failed: "+err.msg)
-    except:
-        raise